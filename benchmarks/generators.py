@@ -0,0 +1,102 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+# Synthetic filter sets and message streams for benchmarks.
+
+import random
+import typing
+
+source_count = 8
+values_per_key = 16
+
+
+def make_key_sets(count: int, rnd: random.Random, key_pool_size: int = 64) -> typing.List[typing.Tuple[str, ...]]:
+    key_pool = [f"key_{num}" for num in range(key_pool_size)]
+    key_sets = set()
+    while len(key_sets) < count:
+        key_sets.add(tuple(sorted(rnd.sample(key_pool, rnd.randint(1, 6)))))
+    return sorted(key_sets)
+
+
+def make_src_path(field: str, depth: int) -> str:
+    return ".".join([f"l{level}" for level in range(depth - 1)] + [f"f{field}"])
+
+
+def make_filters(count: int, key_sets: int, depth: int, width: int, rnd: random.Random, unique: bool = False, sources: int = source_count) -> typing.List[typing.Dict]:
+    """
+    Create filters spread over a number of sources and identifier key sets. The first key of every key set carries a
+    value, so filters sharing a key set are split into several identification groups.
+    :param count: Number of filters.
+    :param key_sets: Number of distinct identifier key sets, 0 creates filters without identifiers.
+    :param depth: Number of path segments of every mapping source path.
+    :param width: Number of data mappings per filter.
+    :param rnd: Random object.
+    :param unique: Create filters with unique source paths and identifier keys instead of sharing them.
+    :param sources: Number of sources the filters are spread over.
+    :return: List of filter dictionaries.
+    """
+    sets = make_key_sets(count=key_sets, rnd=rnd) if key_sets else None
+    filters = list()
+    for num in range(count):
+        mappings = {f"d{field}:data": make_src_path(field=f"{num}_{field}" if unique else str(field), depth=depth) for field in range(width)}
+        mappings["time:extra"] = "time"
+        filter = {
+            "source": f"src_{num % sources}",
+            "mappings": mappings,
+            "id": f"filter-{num}",
+            "args": {"num": num}
+        }
+        if sets:
+            keys = sets[num % len(sets)]
+            if unique:
+                keys = tuple(f"{key}_{num}" for key in keys)
+            filter["identifiers"] = [{"key": keys[0], "value": f"v{rnd.randrange(values_per_key)}"}] + [{"key": key} for key in keys[1:]]
+        filters.append(filter)
+    return filters
+
+
+def make_message(filter: typing.Dict, rnd: random.Random) -> typing.Dict:
+    message = {"time": 0}
+    for identifier in filter.get("identifiers") or ():
+        message[identifier["key"]] = identifier.get("value")
+    for src_path in filter["mappings"].values():
+        if src_path != "time":
+            *keys, key = src_path.split(".")
+            node = message
+            for level_key in keys:
+                node = node.setdefault(level_key, dict())
+            node[key] = rnd.random()
+    return message
+
+
+def make_messages(filters: typing.List[typing.Dict], count: int, miss_ratio: float, rnd: random.Random) -> typing.List[typing.Tuple[str, typing.Dict]]:
+    """
+    Create (source, message) tuples that match a random filter or, with a probability of miss_ratio, no filter.
+    :param filters: Filters created by make_filters.
+    :param count: Number of messages.
+    :param miss_ratio: Fraction of messages without filters.
+    :param rnd: Random object.
+    :return: List of (source, message) tuples.
+    """
+    messages = list()
+    for _ in range(count):
+        filter = rnd.choice(filters)
+        message = make_message(filter=filter, rnd=rnd)
+        if rnd.random() < miss_ratio:
+            messages.append(("src_unknown", {key: value for key, value in message.items() if not key.startswith("key_")}))
+        else:
+            messages.append((filter["source"], message))
+    return messages
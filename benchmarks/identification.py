@@ -0,0 +1,71 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+# Measures get_results cost per message for a growing number of identifier key sets.
+# Run from the repository root: python -m benchmarks.identification [SIZE ...]
+
+import mf_lib
+import random
+import time
+import sys
+
+sizes = (10, 100, 1000, 10000, 100000)
+key_pool = [f"key_{num}" for num in range(64)]
+messages_per_size = 10000
+
+
+def make_filter_handler(size: int, rnd: random.Random):
+    filter_handler = mf_lib.FilterHandler()
+    key_sets = set()
+    while len(key_sets) < size:
+        key_sets.add(tuple(sorted(rnd.sample(key_pool, rnd.randint(1, 6)))))
+    for num, key_set in enumerate(key_sets):
+        filter_handler.add_filter(
+            filter={
+                "source": "src",
+                "identifiers": [{"key": key} for key in key_set],
+                "mappings": {"val:data": "val"},
+                "id": str(num)
+            }
+        )
+    return filter_handler, list(key_sets)
+
+
+def make_messages(key_sets: list, rnd: random.Random):
+    messages = list()
+    for _ in range(messages_per_size):
+        message = {key: None for key in rnd.choice(key_sets)}
+        for key in rnd.sample(key_pool, 4):
+            message[key] = None
+        message["val"] = 1
+        messages.append(message)
+    return messages
+
+
+def run(size: int):
+    rnd = random.Random(size)
+    filter_handler, key_sets = make_filter_handler(size=size, rnd=rnd)
+    messages = make_messages(key_sets=key_sets, rnd=rnd)
+    start = time.perf_counter()
+    for message in messages:
+        for _ in filter_handler.get_results(message=message, source="src"):
+            pass
+    return (time.perf_counter() - start) / len(messages)
+
+
+if __name__ == '__main__':
+    for size in (int(arg) for arg in sys.argv[1:]) if len(sys.argv) > 1 else sizes:
+        print(f"identifier sets={size:>7}  {run(size) * 1e6:8.2f} us/msg")
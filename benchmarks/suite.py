@@ -0,0 +1,142 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+# Measures filter update throughput, get_results throughput and latency and memory per filter for synthetic scenarios.
+# Run from the repository root: python -m benchmarks.suite [--quick] [--output FILE] [--compare FILE] [--threshold PCT]
+
+from .generators import *
+import mf_lib
+import argparse
+import platform
+import tracemalloc
+import random
+import time
+import json
+import sys
+
+scenarios = {
+    "small": dict(filters=100, key_sets=10, depth=2, width=4, miss_ratio=0.1),
+    "many_filters": dict(filters=20000, key_sets=100, depth=2, width=4, miss_ratio=0.1),
+    "many_key_sets": dict(filters=5000, key_sets=2000, depth=2, width=4, miss_ratio=0.1),
+    "no_identifiers": dict(filters=1000, key_sets=0, depth=2, width=4, miss_ratio=0.1),
+    "deep_mappings": dict(filters=1000, key_sets=10, depth=8, width=4, miss_ratio=0.1),
+    "wide_mappings": dict(filters=1000, key_sets=10, depth=2, width=32, miss_ratio=0.1),
+    "high_miss_ratio": dict(filters=1000, key_sets=100, depth=2, width=4, miss_ratio=0.9),
+    "unique_paths": dict(filters=8000, key_sets=100, depth=2, width=4, miss_ratio=0.1, unique=True),
+    "single_source": dict(filters=8000, key_sets=0, depth=2, width=4, miss_ratio=0.1, sources=1)
+}
+quick_scenarios = ("small", "deep_mappings", "high_miss_ratio")
+messages_per_scenario = 20000
+higher_is_better = ("add_filters_per_sec", "delete_filters_per_sec", "messages_per_sec")
+lower_is_better = ("latency_p50_us", "latency_p99_us", "bytes_per_filter")
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(filters: int, key_sets: int, depth: int, width: int, miss_ratio: float, unique: bool = False, sources: int = source_count) -> dict:
+    rnd = random.Random(filters * 31 + key_sets)
+    filter_list = make_filters(count=filters, key_sets=key_sets, depth=depth, width=width, rnd=rnd, unique=unique, sources=sources)
+    messages = make_messages(filters=filter_list, count=messages_per_scenario, miss_ratio=miss_ratio, rnd=rnd)
+    tracemalloc.start()
+    start_mem = tracemalloc.get_traced_memory()[0]
+    filter_handler = mf_lib.FilterHandler()
+    filter_handler.add_filters(filters=filter_list)
+    memory = tracemalloc.get_traced_memory()[0] - start_mem
+    tracemalloc.stop()
+    del filter_handler
+    filter_handler = mf_lib.FilterHandler()
+    start = time.perf_counter()
+    for filter in filter_list:
+        filter_handler.add_filter(filter=filter)
+    add_time = time.perf_counter() - start
+    latencies = list()
+    get_results = filter_handler.get_results
+    perf_counter_ns = time.perf_counter_ns
+    for source, message in messages:
+        start = perf_counter_ns()
+        for _ in get_results(message=message, source=source, ignore_no_filter=True):
+            pass
+        latencies.append(perf_counter_ns() - start)
+    start = time.perf_counter()
+    for filter in filter_list:
+        filter_handler.delete_filter(id=filter["id"])
+    delete_time = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "add_filters_per_sec": round(filters / add_time, 1),
+        "delete_filters_per_sec": round(filters / delete_time, 1),
+        "messages_per_sec": round(len(latencies) / (sum(latencies) / 1e9), 1),
+        "latency_p50_us": round(percentile(latencies, 0.5) / 1e3, 3),
+        "latency_p99_us": round(percentile(latencies, 0.99) / 1e3, 3),
+        "bytes_per_filter": round(memory / filters, 1)
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare results with a baseline.
+    :param results: Results by scenario.
+    :param baseline: Baseline results by scenario.
+    :param threshold: Allowed relative change in percent.
+    :return: List of (scenario, metric, baseline value, value) tuples of regressions.
+    """
+    regressions = list()
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in metrics.items():
+            base = baseline[name].get(metric)
+            if not base:
+                continue
+            change = (value - base) / base * 100
+            if (metric in higher_is_better and change < -threshold) or (metric in lower_is_better and change > threshold):
+                regressions.append((name, metric, base, value))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="message-filter-lib benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="run a subset of scenarios")
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios), help="scenario to run, can be repeated")
+    parser.add_argument("--output", help="store results as a JSON baseline")
+    parser.add_argument("--compare", help="compare results with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed relative change in percent, default 10")
+    args = parser.parse_args()
+    names = args.scenario or (quick_scenarios if args.quick else tuple(scenarios))
+    results = dict()
+    for name in names:
+        results[name] = run(**scenarios[name])
+        print(f"{name:<16} " + "  ".join(f"{metric}={value}" for metric, value in results[name].items()))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({
+                "version": mf_lib.__version__,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "messages_per_scenario": messages_per_scenario,
+                "scenarios": {name: scenarios[name] for name in names},
+                "results": results
+            }, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results=results, baseline=baseline["results"], threshold=args.threshold)
+        for name, metric, base, value in regressions:
+            print(f"regression: {name} {metric} {base} -> {value}")
+        if regressions:
+            sys.exit(1)
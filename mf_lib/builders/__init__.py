@@ -16,3 +16,5 @@
 
 from ._builders import *
 
+from ._columns import *
+from ._wire import *
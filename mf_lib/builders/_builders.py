@@ -16,6 +16,7 @@
 
 __all__ = ("dict_builder", "string_list_builder", "tuple_list_builder")
 
+import functools
 import typing
 
 
@@ -26,6 +27,17 @@ def dict_builder(mapper: typing.Generator) -> typing.Dict[str, typing.Any]:
     return data
 
 
+def _build_dict(keys: typing.Tuple[str, ...], values: typing.Sequence) -> typing.Dict[str, typing.Any]:
+    return dict(zip(keys, values))
+
+
+def _compile_dict_builder(keys: typing.Tuple[str, ...]) -> typing.Callable[[typing.Sequence], typing.Dict[str, typing.Any]]:
+    return functools.partial(_build_dict, keys)
+
+
+dict_builder.compile = _compile_dict_builder
+
+
 def string_list_builder(mapper: typing.Generator) -> typing.List[str]:
     data = list()
     for key, value in mapper:
@@ -33,8 +45,30 @@ def string_list_builder(mapper: typing.Generator) -> typing.List[str]:
     return data
 
 
+def _build_string_list(prefixes: typing.Tuple[str, ...], values: typing.Sequence) -> typing.List[str]:
+    return [f'{prefix}{value}' for prefix, value in zip(prefixes, values)]
+
+
+def _compile_string_list_builder(keys: typing.Tuple[str, ...]) -> typing.Callable[[typing.Sequence], typing.List[str]]:
+    return functools.partial(_build_string_list, tuple(f'{key}=' for key in keys))
+
+
+string_list_builder.compile = _compile_string_list_builder
+
+
 def tuple_list_builder(mapper: typing.Generator) -> typing.List[typing.Tuple[str, typing.Any]]:
     data = list()
     for key, value in mapper:
         data.append((key, value))
     return data
+
+
+def _build_tuple_list(keys: typing.Tuple[str, ...], values: typing.Sequence) -> typing.List[typing.Tuple[str, typing.Any]]:
+    return list(zip(keys, values))
+
+
+def _compile_tuple_list_builder(keys: typing.Tuple[str, ...]) -> typing.Callable[[typing.Sequence], typing.List[typing.Tuple[str, typing.Any]]]:
+    return functools.partial(_build_tuple_list, keys)
+
+
+tuple_list_builder.compile = _compile_tuple_list_builder
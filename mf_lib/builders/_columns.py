@@ -0,0 +1,112 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("ColumnBuffer",)
+
+import typing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _get_dtype(values: typing.Iterable) -> typing.Any:
+    types = {type(value) for value in values}
+    types.discard(type(None))
+    if types == {bool}:
+        return numpy.bool_
+    if types == {int}:
+        return numpy.int64
+    if types and types <= {int, float}:
+        return numpy.float64
+    return object
+
+
+class ColumnBuffer:
+    """
+    Collects extracted data of multiple messages in one column per destination path. Missing values are stored as
+    None and their row positions are recorded in missing.
+    """
+    def __init__(self, keys: typing.Sequence[str]):
+        self.keys = tuple(keys)
+        self.columns = {key: list() for key in self.keys}
+        self.missing = dict()
+        self.size = 0
+
+    def append(self, mapper: typing.Generator):
+        """
+        Append a row. The row is discarded if the mapper raises an exception.
+        :param mapper: Generator yielding key value tuples.
+        :return: None
+        """
+        columns = self.columns
+        try:
+            for key, value in mapper:
+                columns[key].append(value)
+        except Exception:
+            self.truncate(self.size)
+            raise
+        self.size += 1
+        for key, column in columns.items():
+            if len(column) < self.size:
+                column.append(None)
+                if key not in self.missing:
+                    self.missing[key] = [self.size - 1]
+                else:
+                    self.missing[key].append(self.size - 1)
+
+    def truncate(self, size: int):
+        """
+        Remove all rows starting at a row position.
+        :param size: Number of rows to keep.
+        :return: None
+        """
+        for column in self.columns.values():
+            del column[size:]
+        for key in tuple(self.missing):
+            self.missing[key] = [pos for pos in self.missing[key] if pos < size]
+            if not self.missing[key]:
+                del self.missing[key]
+        self.size = min(self.size, size)
+
+    def to_arrays(self) -> typing.Tuple[typing.Dict[str, typing.Any], typing.Dict[str, typing.Any]]:
+        """
+        Convert columns to NumPy arrays. Columns containing only booleans, integers or floats become typed arrays,
+        other columns become object arrays. Requires NumPy.
+        :return: Tuple of dictionaries containing arrays and boolean masks of missing values by destination path.
+        """
+        if numpy is None:
+            raise ModuleNotFoundError("NumPy is required for converting columns to arrays")
+        arrays = dict()
+        masks = dict()
+        for key, column in self.columns.items():
+            dtype = _get_dtype(column)
+            if key in self.missing:
+                mask = numpy.zeros(self.size, dtype=numpy.bool_)
+                mask[self.missing[key]] = True
+                masks[key] = mask
+                if dtype is not object:
+                    fill = numpy.nan if dtype is numpy.float64 else dtype(0)
+                    column = [fill if value is None else value for value in column]
+            try:
+                arrays[key] = numpy.array(column, dtype=dtype)
+            except OverflowError:
+                arrays[key] = numpy.array(column, dtype=object)
+        return arrays, masks
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,264 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("json_builder", "line_protocol_builder", "JsonWriter", "LineProtocolWriter")
+
+import json.encoder
+import functools
+import typing
+import math
+import re
+
+_json_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+_json_string = json.encoder.encode_basestring
+_int_repr = int.__repr__
+_float_repr = float.__repr__
+_measurement_escape = re.compile(r"([, \\])")
+_key_escape = re.compile(r"([,= \\])")
+_string_escape = re.compile(r'(["\\])')
+
+
+def _json_value(value: typing.Any) -> str:
+    value_type = type(value)
+    if value_type is str:
+        return _json_string(value)
+    if value_type is int:
+        return _int_repr(value)
+    if value_type is float:
+        return _float_repr(value) if math.isfinite(value) else _json_encode(value)
+    if value is None:
+        return "null"
+    if value_type is bool:
+        return "true" if value else "false"
+    return _json_encode(value)
+
+
+def _build_json(template: str, values: typing.Sequence) -> bytes:
+    return (template % tuple(map(_json_value, values))).encode()
+
+
+def _compile_json_builder(keys: typing.Tuple[str, ...]) -> typing.Callable[[typing.Sequence], bytes]:
+    template = "{" + ",".join(_json_string(key).replace("%", "%%") + ":%s" for key in keys) + "}"
+    return functools.partial(_build_json, template)
+
+
+def json_builder(mapper: typing.Generator) -> bytes:
+    """
+    Build a compact UTF-8 encoded JSON object.
+    """
+    return "".join(("{", ",".join(_json_string(key) + ":" + _json_value(value) for key, value in mapper), "}")).encode()
+
+
+json_builder.compile = _compile_json_builder
+
+
+def _escape_key(key: str) -> str:
+    return _key_escape.sub(r"\\\1", key).replace("\n", "\\n")
+
+
+def _field_value(value: typing.Any) -> typing.Optional[str]:
+    value_type = type(value)
+    if value_type is float:
+        return _float_repr(value) if math.isfinite(value) else None
+    if value_type is int:
+        return _int_repr(value) + "i"
+    if value_type is str:
+        return '"' + _string_escape.sub(r"\\\1", value).replace("\n", "\\n") + '"'
+    if value_type is bool:
+        return "true" if value else "false"
+    if value is None:
+        return None
+    return _field_value(_json_encode(value))
+
+
+def _build_fields(prefixes: typing.Tuple[str, ...], values: typing.Sequence) -> bytes:
+    fields = list()
+    for prefix, value in zip(prefixes, values):
+        value = _field_value(value)
+        if value is not None:
+            fields.append(prefix + value)
+    return ",".join(fields).encode()
+
+
+def _compile_line_protocol_builder(keys: typing.Tuple[str, ...]) -> typing.Callable[[typing.Sequence], bytes]:
+    return functools.partial(_build_fields, tuple(_escape_key(key) + "=" for key in keys))
+
+
+def line_protocol_builder(mapper: typing.Generator) -> bytes:
+    """
+    Build the UTF-8 encoded field set of a line protocol line. None and non-finite float values are omitted,
+    integers are written as integer fields and values other than strings, numbers and booleans as JSON strings.
+    """
+    keys = list()
+    values = list()
+    for key, value in mapper:
+        keys.append(_escape_key(key) + "=")
+        values.append(value)
+    return _build_fields(keys, values)
+
+
+line_protocol_builder.compile = _compile_line_protocol_builder
+
+
+class JsonWriter:
+    """
+    Collects JSON documents created by json_builder in a reusable buffer, either as a JSON array or as newline
+    delimited JSON.
+    """
+    def __init__(self, lines: bool = False):
+        """
+        :param lines: Write newline delimited JSON instead of a JSON array. Default is False.
+        """
+        self.__lines = lines
+        self.__buffer = bytearray()
+        self.__count = 0
+
+    def append(self, result: typing.Any) -> bool:
+        """
+        Append the data of a result built by json_builder. Results containing an exception are skipped.
+        :param result: FilterResult object.
+        :return: True if the result has been appended.
+        """
+        if result.ex is not None:
+            return False
+        if self.__lines:
+            self.__buffer += result.data
+            self.__buffer += b"\n"
+        else:
+            self.__buffer += b"," if self.__count else b"["
+            self.__buffer += result.data
+        self.__count += 1
+        return True
+
+    def extend(self, results: typing.Iterable) -> int:
+        """
+        Append multiple results.
+        :param results: Iterable of FilterResult objects.
+        :return: Number of appended results.
+        """
+        count = 0
+        for result in results:
+            count += self.append(result)
+        return count
+
+    def getvalue(self) -> bytes:
+        """
+        Get the payload containing all appended results.
+        :return: UTF-8 encoded JSON array or newline delimited JSON.
+        """
+        if self.__lines:
+            return bytes(self.__buffer)
+        return bytes(self.__buffer) + b"]" if self.__count else b"[]"
+
+    def clear(self):
+        """
+        Remove all appended results but keep the buffer for reuse.
+        :return: None
+        """
+        del self.__buffer[:]
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+
+class LineProtocolWriter:
+    """
+    Writes results with data built by line_protocol_builder as line protocol lines into a reusable buffer. The
+    measurement, tags and timestamp of a line are taken from the extra data of a result, which must be a dictionary.
+    """
+    def __init__(self, measurement: typing.Optional[str] = None, measurement_key: typing.Optional[str] = None, tag_keys: typing.Sequence[str] = (), time_key: typing.Optional[str] = "time", time_converter: typing.Optional[typing.Callable[[typing.Any], int]] = None):
+        """
+        :param measurement: Measurement of all lines.
+        :param measurement_key: Extra key containing the measurement, takes precedence over measurement if present.
+        :param tag_keys: Extra keys written as tags if present.
+        :param time_key: Extra key containing the timestamp as integer. Default is "time", lines without timestamp are written if the key is missing.
+        :param time_converter: Callable converting extra timestamps to integers, e.g. for ISO 8601 strings.
+        """
+        assert measurement or measurement_key, "'measurement' or 'measurement_key' required"
+        self.__measurement = self.__escape_measurement(measurement) if measurement else None
+        self.__measurement_key = measurement_key
+        self.__tag_keys = tuple((key, "," + _escape_key(key) + "=") for key in sorted(tag_keys))
+        self.__time_key = time_key
+        self.__time_converter = time_converter
+        self.__buffer = bytearray()
+        self.__count = 0
+
+    @staticmethod
+    def __escape_measurement(measurement: str) -> str:
+        return _measurement_escape.sub(r"\\\1", measurement).replace("\n", "\\n")
+
+    def append(self, result: typing.Any) -> bool:
+        """
+        Append a line for a result. Results containing an exception or no fields are skipped.
+        :param result: FilterResult object.
+        :return: True if a line has been appended.
+        """
+        if result.ex is not None or not result.data:
+            return False
+        extra = result.extra or dict()
+        measurement = extra.get(self.__measurement_key) if self.__measurement_key else None
+        head = self.__measurement if measurement is None else self.__escape_measurement(str(measurement))
+        if head is None:
+            raise ValueError(f"missing measurement key '{self.__measurement_key}'")
+        for key, prefix in self.__tag_keys:
+            value = extra.get(key)
+            if value is not None and value != "":
+                head += prefix + _escape_key(str(value))
+        timestamp = extra.get(self.__time_key) if self.__time_key else None
+        if timestamp is not None:
+            if self.__time_converter is not None:
+                timestamp = self.__time_converter(timestamp)
+            timestamp = int(timestamp)
+        buffer = self.__buffer
+        buffer += head.encode()
+        buffer += b" "
+        buffer += result.data
+        if timestamp is not None:
+            buffer += b" "
+            buffer += _int_repr(timestamp).encode()
+        buffer += b"\n"
+        self.__count += 1
+        return True
+
+    def extend(self, results: typing.Iterable) -> int:
+        """
+        Append lines for multiple results.
+        :param results: Iterable of FilterResult objects.
+        :return: Number of appended lines.
+        """
+        count = 0
+        for result in results:
+            count += self.append(result)
+        return count
+
+    def getvalue(self) -> bytes:
+        """
+        Get the payload containing all appended lines.
+        :return: UTF-8 encoded line protocol.
+        """
+        return bytes(self.__buffer)
+
+    def clear(self):
+        """
+        Remove all appended lines but keep the buffer for reuse.
+        :return: None
+        """
+        del self.__buffer[:]
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
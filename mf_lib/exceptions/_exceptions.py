@@ -17,6 +17,13 @@
 import traceback
 
 
+def _restore_error(cls, msg, ex):
+    obj = cls.__new__(cls)
+    Exception.__init__(obj, msg)
+    obj.ex = ex
+    return obj
+
+
 class FilterHandlerError(Exception):
     def __init__(self, msg, msg_args=None, ex=None):
         self.ex = ex
@@ -27,12 +34,20 @@ class FilterHandlerError(Exception):
             msg += msg_args
         super().__init__(msg)
 
+    def __reduce__(self):
+        return _restore_error, (self.__class__, str(self), self.ex)
+
 
 class MessageIdentificationError(FilterHandlerError):
     def __init__(self, ex):
         super().__init__(msg="message identification failed: ", ex=ex)
 
 
+class MessageDecodeError(FilterHandlerError):
+    def __init__(self, ex):
+        super().__init__(msg="message decoding failed: ", ex=ex)
+
+
 class NoFilterError(FilterHandlerError):
     def __init__(self):
         super().__init__("no filters for message")
@@ -53,6 +68,31 @@ class DeleteFilterError(FilterHandlerError):
         super().__init__(msg="deleting filter failed: ", ex=ex)
 
 
+class ReplaceFiltersError(FilterHandlerError):
+    def __init__(self, ex):
+        super().__init__(msg="replacing filters failed: ", ex=ex)
+
+
+class SaveStateError(FilterHandlerError):
+    def __init__(self, ex):
+        super().__init__(msg="saving state failed: ", ex=ex)
+
+
+class LoadStateError(FilterHandlerError):
+    def __init__(self, ex):
+        super().__init__(msg="loading state failed: ", ex=ex)
+
+
 class UnknownFilterIDError(FilterHandlerError):
     def __init__(self, filter_id):
         super().__init__(msg=f"filter ID '{filter_id}' unknown")
+
+
+class SinkFullError(FilterHandlerError):
+    def __init__(self, max_pending):
+        super().__init__(msg=f"sink full: max_pending={max_pending}")
+
+
+class SinkClosedError(FilterHandlerError):
+    def __init__(self):
+        super().__init__("sink closed")
@@ -15,3 +15,6 @@
 """
 
 from ._handler import *
+from ._async import *
+from ._sharded import *
+from ._sink import *
@@ -0,0 +1,167 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("AsyncFilterHandler",)
+
+from ._handler import *
+import mf_lib.builders
+import concurrent.futures
+import functools
+import asyncio
+import typing
+
+
+class _End:
+    pass
+
+
+class _Error:
+    def __init__(self, ex):
+        self.ex = ex
+
+
+class AsyncFilterHandler:
+    """
+    Asyncio front-end for a FilterHandler. Filter updates are run in an executor, messages are applied in batches
+    that are read from a bounded queue.
+    """
+    def __init__(self, filter_handler: typing.Optional[FilterHandler] = None, queue_size: int = 1000, batch_size: int = 100, executor: typing.Optional[concurrent.futures.Executor] = None, executor_threshold: typing.Optional[int] = None):
+        """
+        :param filter_handler: FilterHandler object, a new one is created if not provided.
+        :param queue_size: Maximum number of messages read ahead of the consumer.
+        :param batch_size: Maximum number of messages applied per batch.
+        :param executor: Executor for filter updates and large batches. Default is the event loop's default executor.
+        :param executor_threshold: Minimum batch size for applying filters in the executor. Default is None, batches are applied in the event loop.
+        """
+        self.filter_handler = filter_handler or FilterHandler()
+        self.__queue_size = queue_size
+        self.__batch_size = batch_size
+        self.__executor = executor
+        self.__executor_threshold = executor_threshold
+
+    async def __run(self, func: typing.Callable, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, functools.partial(func, **kwargs))
+
+    async def add_filter(self, filter: typing.Dict):
+        """
+        Add a filter without blocking the event loop.
+        :param filter: Dictionary containing filter data.
+        :return: None
+        """
+        await self.__run(self.filter_handler.add_filter, filter=filter)
+
+    async def add_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Add multiple filters without blocking the event loop.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
+        await self.__run(self.filter_handler.add_filters, filters=filters)
+
+    async def delete_filter(self, id: str):
+        """
+        Delete a filter without blocking the event loop.
+        :param id: ID of a filter to be deleted.
+        :return: None
+        """
+        await self.__run(self.filter_handler.delete_filter, id=id)
+
+    async def delete_filters(self, ids: typing.Iterable[str]):
+        """
+        Delete multiple filters without blocking the event loop.
+        :param ids: Iterable of IDs of filters to be deleted.
+        :return: None
+        """
+        await self.__run(self.filter_handler.delete_filters, ids=ids)
+
+    async def replace_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Replace all filters without blocking the event loop.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
+        await self.__run(self.filter_handler.replace_filters, filters=filters)
+
+    @staticmethod
+    async def __produce(messages: typing.AsyncIterable[typing.Tuple[typing.Optional[str], typing.Dict]], queue: asyncio.Queue):
+        try:
+            async for item in messages:
+                await queue.put(item)
+            await queue.put(_End())
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            await queue.put(_Error(ex))
+
+    def __apply(self, batch: typing.List[typing.Tuple[typing.Optional[str], typing.Dict]], **kwargs) -> typing.List[typing.Tuple[typing.Optional[str], typing.Dict, typing.List[FilterResult]]]:
+        batch_result = self.filter_handler.get_results_batch(messages=[item[1] for item in batch], sources=[item[0] for item in batch], ignore_no_filter=True, **kwargs)
+        msg_results = [list() for _ in batch]
+        for group in batch_result:
+            for pos, result in group:
+                msg_results[pos].append(result)
+        for pos, ex in batch_result.errors.items():
+            msg_results[pos] = [FilterResult(ex=ex)]
+        return [(source, message, results) for (source, message), results in zip(batch, msg_results)]
+
+    async def get_results(self, messages: typing.AsyncIterable[typing.Tuple[typing.Optional[str], typing.Dict]], data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, include_args: bool = False) -> typing.AsyncGenerator[typing.Tuple[typing.Optional[str], typing.Dict, typing.List[FilterResult]], None]:
+        """
+        Async generator that applies filters to a stream of messages and yields a (source, message, results) tuple
+        for every message in message order. Results is empty for messages without filters, a failed message
+        identification results in a single FilterResult object containing a MessageIdentificationError.
+        :param messages: Async iterable of (source, message) tuples.
+        :param data_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param extra_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param include_args: Store filter arguments by filter ID in FilterResult.args. Default is False.
+        :returns: Tuples of source, message and list of FilterResult objects.
+        """
+        kwargs = {
+            "data_builder": data_builder,
+            "extra_builder": extra_builder,
+            "data_ignore_missing_keys": data_ignore_missing_keys,
+            "extra_ignore_missing_keys": extra_ignore_missing_keys,
+            "include_args": include_args
+        }
+        queue = asyncio.Queue(maxsize=self.__queue_size)
+        producer = asyncio.ensure_future(self.__produce(messages=messages, queue=queue))
+        try:
+            end = None
+            while end is None:
+                item = await queue.get()
+                batch = list()
+                while True:
+                    if isinstance(item, (_End, _Error)):
+                        end = item
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.__batch_size:
+                        break
+                    try:
+                        item = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                if batch:
+                    if self.__executor_threshold is not None and len(batch) >= self.__executor_threshold:
+                        results = await self.__run(self.__apply, batch=batch, **kwargs)
+                    else:
+                        results = self.__apply(batch=batch, **kwargs)
+                    for item in results:
+                        yield item
+            if isinstance(end, _Error):
+                raise end.ex
+        finally:
+            producer.cancel()
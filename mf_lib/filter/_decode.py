@@ -0,0 +1,135 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import json.decoder
+import json.scanner
+import typing
+import re
+
+_whitespace = re.compile(r"[ \t\n\r]*")
+_string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_scalar = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null")
+_flat_container = re.compile(r'\[[^\[\]{}"]*]|\{[^\[\]{}"]*}')
+_member = r'"{}[^"\\]*"[ \t\n\r]*:[ \t\n\r]*(?:"[^"\\]*(?:\\.[^"\\]*)*"|-?\d[\d.eE+-]*|true|false|null|\[[^\[\]{{}}"]*]|\{{[^\[\]{{}}"]*}})[ \t\n\r]*,[ \t\n\r]*'
+_scan_value = json.scanner.make_scanner(json.JSONDecoder())
+_scan_string = json.decoder.scanstring
+
+
+class PathNode:
+    """
+    Node of a path tree. Children of None mark keys whose complete value is required. The skip pattern matches runs
+    of object members with unreferenced keys and simple values.
+    """
+    __slots__ = ("children", "skip")
+
+    def __init__(self, children: typing.Dict[str, typing.Optional["PathNode"]]):
+        self.children = children
+        keys = "|".join(re.escape(key) for key in sorted(children))
+        self.skip = re.compile("(?:" + _member.format(f'(?!(?:{keys})")' if keys else "") + ")*")
+
+
+def build_path_tree(paths: typing.Iterable[typing.Tuple[str, ...]]) -> PathNode:
+    """
+    Merge paths into a tree.
+    :param paths: Iterable of paths as key tuples.
+    :return: PathNode object.
+    """
+    tree = dict()
+    for path in sorted(paths, key=len):
+        node = tree
+        for key in path[:-1]:
+            if key in node and node[key] is None:
+                break
+            node = node.setdefault(key, dict())
+        else:
+            node[path[-1]] = None
+
+    def compile_node(node: typing.Dict) -> PathNode:
+        return PathNode({key: None if value is None else compile_node(value) for key, value in node.items()})
+
+    return compile_node(tree)
+
+
+def _skip_value(s: str, idx: int) -> int:
+    char = s[idx]
+    if char == '"':
+        match = _string.match(s, idx)
+    elif char == "[" or char == "{":
+        match = _flat_container.match(s, idx)
+        if not match:
+            return _scan_value(s, idx)[1]
+    else:
+        match = _scalar.match(s, idx)
+    if not match:
+        raise json.JSONDecodeError("Expecting value", s, idx)
+    return match.end()
+
+
+def _decode_object(s: str, idx: int, node: PathNode, stop: bool) -> typing.Tuple[typing.Dict, typing.Optional[int]]:
+    obj = dict()
+    tree = node.children
+    skip = node.skip.match
+    remaining = len(tree)
+    if stop and not remaining:
+        return obj, None
+    idx = _whitespace.match(s, idx + 1).end()
+    if s[idx] == "}":
+        return obj, idx + 1
+    while True:
+        idx = skip(s, idx).end()
+        if s[idx] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", s, idx)
+        key, idx = _scan_string(s, idx + 1)
+        idx = _whitespace.match(s, idx).end()
+        if s[idx] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", s, idx)
+        idx = _whitespace.match(s, idx + 1).end()
+        if key in tree and key not in obj:
+            remaining -= 1
+            sub_tree = tree[key]
+            if sub_tree is None or s[idx] != "{":
+                obj[key], idx = _scan_value(s, idx)
+            else:
+                obj[key], idx = _decode_object(s, idx, sub_tree, stop and not remaining)
+            if stop and not remaining:
+                return obj, None
+        else:
+            idx = _skip_value(s, idx)
+        idx = _whitespace.match(s, idx).end()
+        char = s[idx]
+        if char == ",":
+            idx = _whitespace.match(s, idx + 1).end()
+        elif char == "}":
+            return obj, idx + 1
+        else:
+            raise json.JSONDecodeError("Expecting ',' delimiter", s, idx)
+
+
+def decode_paths(payload: typing.Union[bytes, bytearray, str], tree: PathNode) -> typing.Any:
+    """
+    Decode a JSON document but only keep the object members referenced by a path tree. Unreferenced values are
+    skipped and decoding stops as soon as all referenced members of the top level object have been read. For
+    duplicate keys the first occurrence is kept, unlike json.loads which keeps the last one.
+    :param payload: JSON document.
+    :param tree: Path tree created by build_path_tree.
+    :return: Decoded document.
+    """
+    if not isinstance(payload, str):
+        payload = payload.decode()
+    idx = _whitespace.match(payload, 0).end()
+    if payload[idx:idx + 1] == "{":
+        return _decode_object(payload, idx, tree, True)[0]
+    return json.loads(payload)
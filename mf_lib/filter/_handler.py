@@ -14,30 +14,43 @@
    limitations under the License.
 """
 
-__all__ = ("FilterHandler", "FilterResult")
+__all__ = ("FilterHandler", "FilterResult", "LazyFilterResult", "FilterResultGroup", "ColumnGroup", "BatchResult", "Stats", "Stage", "Span", "Memory")
 
 from ._util import *
 from ._model import *
+from ._index import *
+from ._snapshot import *
+from ._metrics import *
+from ._tracing import *
 import mf_lib.exceptions
 import mf_lib.builders
 import typing
 import threading
+import functools
+import operator
+import time
+import sys
 
 
 class FilterResult:
     """
-    Stores extracted data and corresponding filter IDs or an exception.
+    Stores extracted data and corresponding filter IDs or an exception. Filter arguments by filter ID are only
+    stored if requested and are omitted from iteration if not set.
     """
-    def __init__(self, data=None, extra=None, filter_ids=None, ex=None):
+    __slots__ = ("data", "extra", "filter_ids", "ex", "args")
+
+    def __init__(self, data=None, extra=None, filter_ids=None, ex=None, args=None):
         self.data = data
         self.extra = extra
         self.filter_ids = filter_ids
         self.ex = ex
+        self.args = args
 
     def __iter__(self):
-        for item in self.__dict__.items():
-            if not item[0].startswith("_"):
-                yield item
+        for key in FilterResult.__slots__:
+            value = getattr(self, key)
+            if value is not None or key != "args":
+                yield key, value
 
     def __str__(self):
         return str(dict(self))
@@ -47,108 +60,317 @@ class FilterResult:
         return f"{self.__class__.__name__}({args})"
 
 
+_data = FilterResult.data
+_extra = FilterResult.extra
+_ex = FilterResult.ex
+
+
+class LazyFilterResult(FilterResult):
+    """
+    FilterResult that extracts and builds data and extra when data, extra or ex is accessed for the first time.
+    Filter IDs and arguments are available without extraction. Extraction errors are stored in ex like for other
+    results. The message is referenced until extraction and must not be modified before.
+    """
+    __slots__ = ("_evaluate",)
+
+    def __init__(self, evaluate: typing.Callable[[], FilterResult], filter_ids=None, args=None):
+        self._evaluate = evaluate
+        self.filter_ids = filter_ids
+        self.args = args
+
+    def __load(self):
+        evaluate = self._evaluate
+        if evaluate is not None:
+            result = evaluate()
+            _data.__set__(self, result.data)
+            _extra.__set__(self, result.extra)
+            _ex.__set__(self, result.ex)
+            self._evaluate = None
+
+    @property
+    def evaluated(self) -> bool:
+        return self._evaluate is None
+
+    @property
+    def data(self):
+        self.__load()
+        return _data.__get__(self)
+
+    @data.setter
+    def data(self, value):
+        self.__load()
+        _data.__set__(self, value)
+
+    @property
+    def extra(self):
+        self.__load()
+        return _extra.__get__(self)
+
+    @extra.setter
+    def extra(self, value):
+        self.__load()
+        _extra.__set__(self, value)
+
+    @property
+    def ex(self):
+        self.__load()
+        return _ex.__get__(self)
+
+    @ex.setter
+    def ex(self, value):
+        self.__load()
+        _ex.__set__(self, value)
+
+    def __reduce__(self):
+        return FilterResult, (self.data, self.extra, self.filter_ids, self.ex, self.args)
+
+
+class FilterResultGroup:
+    """
+    Stores the results of all messages of a batch that have been handled by the same filters.
+    """
+    def __init__(self, filter_ids=None, args=None):
+        self.filter_ids = filter_ids
+        self.args = args
+        self.results = list()
+        self.indices = list()
+
+    def __iter__(self):
+        return zip(self.indices, self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+class ColumnGroup:
+    """
+    Stores the extracted data of all messages of a batch that have been handled by the same filters in columns.
+    Row positions of the column buffers correspond to the message indices, failed messages are stored in errors.
+    """
+    def __init__(self, filter_ids, mappings, args=None):
+        self.filter_ids = filter_ids
+        self.args = args
+        self.indices = list()
+        self.data = mf_lib.builders.ColumnBuffer(keys=[accessor.dst_path for accessor in mappings[MappingType.data]])
+        self.extra = mf_lib.builders.ColumnBuffer(keys=[accessor.dst_path for accessor in mappings[MappingType.extra]])
+        self.errors = dict()
+
+    def __len__(self):
+        return len(self.indices)
+
+
+class BatchResult:
+    """
+    Stores result groups of a batch and errors of messages that could not be handled.
+    """
+    def __init__(self):
+        self.groups = list()
+        self.errors = dict()
+
+    def __iter__(self):
+        return iter(self.groups)
+
+
 class FilterHandler:
     """
     Provides functionality for adding and removing filters as well as applying filters to messages and extracting data.
+    Adding or removing filters publishes a new routing snapshot, applying filters uses the current snapshot without locking.
     """
-    def __init__(self):
+    def __init__(self, identification_cache_size: typing.Optional[int] = 1024, metrics: bool = False):
+        """
+        :param identification_cache_size: Maximum number of message key shapes for which identification results are cached. Default is 1024, None or 0 disables the cache.
+        :param metrics: Collect message counts, result counts and latency histograms, see get_stats. Default is False.
+        """
+        self.__metrics = Metrics() if metrics else None
+        self.__tracing = None
+        self.__identification_cache = None
+        self.__identification_cache_size = identification_cache_size
         self.__lock = threading.Lock()
         self.__identifiers = dict()
+        self.__identifier_index = IdentifierIndex()
         self.__filters = dict()
+        self.__group_changes = dict()
         self.__mappings = dict()
-        self.__sources = set()
-        self.__filter_metadata = dict()
-        self.__mappings_filter_map = dict()
-        self.__identifiers_filter_map = dict()
-        self.__sources_filter_map = dict()
+        self.__filter_entries = dict()
+        self.__mappings_refs = dict()
+        self.__identifiers_refs = dict()
+        self.__sources_refs = dict()
+        self.__shared = dict()
+        self.__identifier_seq = 0
+        self.__predicate_changes = dict()
+        self.__predicate_seq = 0
+        self.__paths = dict()
+        self.__path_changes = dict()
+        self.__flat_paths = dict()
+        self.__flat_path_changes = dict()
+        self.__path_set = PathSet()
+        self.__miss_counts = dict()
+        self.__snapshot = RoutingSnapshot(identifiers=self.__get_identifiers(), filters=SnapshotMap(), paths=self.__path_set)
 
-    def __add_filter(self, i_str, m_hash, filter_id):
-        try:
+    def __get_identifiers(self) -> typing.Union[IdentifierIndex, KeyShapeCache]:
+        if not self.__identification_cache_size:
+            return self.__identifier_index
+        if self.__identification_cache is None:
+            self.__identification_cache = KeyShapeCache(index=self.__identifier_index, maxsize=self.__identification_cache_size)
+        elif self.__identification_cache.index is not self.__identifier_index:
+            self.__identification_cache = self.__identification_cache.renew(index=self.__identifier_index)
+        return self.__identification_cache
+
+    def __add_filter(self, i_str, m_hash, filter_id, entry) -> typing.Hashable:
+        if i_str not in self.__filters:
+            self.__shared[i_str] = i_str
+            self.__filters[i_str] = {m_hash: {filter_id}}
+            if isinstance(i_str, tuple) and has_predicates(i_str[1]):
+                self.__predicate_changes.setdefault(i_str[0], dict())[i_str] = self.__predicate_seq
+                self.__predicate_seq += 1
+        elif m_hash not in self.__filters[i_str]:
+            self.__filters[i_str][m_hash] = {filter_id}
+        else:
             self.__filters[i_str][m_hash].add(filter_id)
-        except KeyError:
-            if i_str not in self.__filters:
-                self.__filters[i_str] = dict()
-            if m_hash not in self.__filters[i_str]:
-                self.__filters[i_str][m_hash] = {filter_id}
+        i_str = self.__shared[i_str]
+        self.__group_changes.setdefault(i_str, dict()).setdefault(m_hash, dict())[filter_id] = entry
+        return i_str
 
     def __del_filter(self, i_str, m_hash, filter_id):
+        self.__group_changes.setdefault(i_str, dict()).setdefault(m_hash, dict())[filter_id] = None
         self.__filters[i_str][m_hash].discard(filter_id)
         if not self.__filters[i_str][m_hash]:
             del self.__filters[i_str][m_hash]
             if not self.__filters[i_str]:
                 del self.__filters[i_str]
+                del self.__shared[i_str]
+                if isinstance(i_str, tuple) and has_predicates(i_str[1]):
+                    self.__predicate_changes.setdefault(i_str[0], dict())[i_str] = None
 
-    def __add_mappings(self, mappings: typing.Dict, m_hash: str, filter_id: str):
+    def __get_group_set(self, i_str: typing.Hashable, changes: typing.Dict[typing.FrozenSet, typing.Dict]) -> typing.Optional[GroupSet]:
+        group_set = self.__snapshot.filters.get(i_str)
+        groups = dict()
+        for m_hash, members in changes.items():
+            group = group_set.groups.get(m_hash) if group_set is not None else None
+            if group is None:
+                group = FilterGroup(m_hash=m_hash, mappings=self.__mappings.get(m_hash), members=dict())
+            groups[m_hash] = group.update(members=members)
+        return (group_set or GroupSet()).update(groups=groups)
+
+    def __publish(self):
+        groups = {i_str: self.__get_group_set(i_str=i_str, changes=changes) for i_str, changes in self.__group_changes.items()}
+        self.__group_changes.clear()
+        if self.__path_changes or self.__flat_path_changes:
+            self.__path_set = self.__path_set.update(paths=self.__path_changes, getters=self.__flat_path_changes)
+            self.__path_changes.clear()
+            self.__flat_path_changes.clear()
+        predicates = self.__snapshot.predicates
+        if self.__predicate_changes:
+            predicates = update_mapping(mapping=predicates, items={set_id: (predicates.get(set_id) or PredicateIndex(keys=dict())).update(keys=keys) for set_id, keys in self.__predicate_changes.items()})
+            self.__predicate_changes.clear()
+        self.__snapshot = RoutingSnapshot(identifiers=self.__get_identifiers(), filters=self.__snapshot.filters.update(groups), paths=self.__path_set, predicates=predicates)
+
+    def __add_flat_paths(self, items: typing.Iterable[typing.Tuple[str, typing.Callable]]):
+        for src_path, getter in items:
+            if src_path not in self.__flat_paths:
+                self.__flat_paths[src_path] = (1, getter)
+                self.__flat_path_changes[src_path] = getter
+            else:
+                count, getter = self.__flat_paths[src_path]
+                self.__flat_paths[src_path] = (count + 1, getter)
+
+    def __del_flat_paths(self, src_paths: typing.Iterable[str]):
+        for src_path in src_paths:
+            count, getter = self.__flat_paths[src_path]
+            if count > 1:
+                self.__flat_paths[src_path] = (count - 1, getter)
+            else:
+                del self.__flat_paths[src_path]
+                self.__flat_path_changes[src_path] = None
+
+    @staticmethod
+    def __get_mappings_flat_paths(parsed_mappings: typing.Dict) -> typing.Generator:
+        for accessors in parsed_mappings.values():
+            for accessor in accessors:
+                yield accessor.src_path, accessor.get
+
+    @staticmethod
+    def __get_identifier_flat_paths(i_keys: typing.Iterable[str]) -> typing.Generator:
+        for key in i_keys:
+            yield key, operator.itemgetter(key)
+
+    def __add_paths(self, paths: typing.Iterable[typing.Tuple[str, ...]]):
+        for path in paths:
+            if path not in self.__paths:
+                self.__paths[path] = 1
+                self.__path_changes[path] = True
+            else:
+                self.__paths[path] += 1
+
+    def __del_paths(self, paths: typing.Iterable[typing.Tuple[str, ...]]):
+        for path in paths:
+            self.__paths[path] -= 1
+            if not self.__paths[path]:
+                del self.__paths[path]
+                self.__path_changes[path] = None
+
+    @staticmethod
+    def __get_mappings_paths(parsed_mappings: typing.Dict) -> typing.Generator:
+        for accessors in parsed_mappings.values():
+            for accessor in accessors:
+                yield accessor.path
+
+    def __add_mappings(self, m_hash: typing.FrozenSet, parsed_mappings: typing.Dict) -> typing.FrozenSet:
         if m_hash not in self.__mappings:
-            self.__mappings[m_hash] = parse_mappings(mappings=mappings)
-        if m_hash not in self.__mappings_filter_map:
-            self.__mappings_filter_map[m_hash] = {filter_id}
+            self.__shared[m_hash] = m_hash
+            self.__mappings[m_hash] = parsed_mappings
+            self.__mappings_refs[m_hash] = 1
+            self.__add_paths(paths=self.__get_mappings_paths(parsed_mappings))
+            self.__add_flat_paths(items=self.__get_mappings_flat_paths(parsed_mappings))
         else:
-            self.__mappings_filter_map[m_hash].add(filter_id)
+            self.__mappings_refs[m_hash] += 1
+        return self.__shared[m_hash]
 
-    def __del_mappings(self, m_hash: str, filter_id: str):
-        self.__mappings_filter_map[m_hash].discard(filter_id)
-        if not self.__mappings_filter_map[m_hash]:
+    def __del_mappings(self, m_hash: typing.FrozenSet, parsed_mappings: typing.Optional[typing.Dict] = None):
+        self.__mappings_refs[m_hash] -= 1
+        if not self.__mappings_refs[m_hash]:
+            if parsed_mappings is not None:
+                parsed_mappings[m_hash] = self.__mappings[m_hash]
+            self.__del_paths(paths=self.__get_mappings_paths(self.__mappings[m_hash]))
+            self.__del_flat_paths(src_paths=(src_path for src_path, getter in self.__get_mappings_flat_paths(self.__mappings[m_hash])))
             del self.__mappings[m_hash]
-            del self.__mappings_filter_map[m_hash]
-
-    def __add_identifier(self, identifiers: list, filter_id: str):
-        i_val_keys = list()
-        i_no_val_keys = list()
-        i_values = dict()
-        for identifier in identifiers:
-            key, value = validate_identifier(**identifier)
-            if key in i_val_keys or key in i_no_val_keys:
-                raise IdentifierKeyError(key, identifiers)
-            if value:
-                i_val_keys.append(key)
-                i_values[key] = value
-            else:
-                i_no_val_keys.append(key)
-        i_val_keys.sort()
-        i_no_val_keys.sort()
-        i_keys = i_val_keys + i_no_val_keys
-        i_hash = hash_list(i_keys)
+            del self.__mappings_refs[m_hash]
+            del self.__shared[m_hash]
+
+    def __add_identifier(self, i_hash: typing.Tuple) -> typing.Tuple:
         if i_hash not in self.__identifiers:
-            self.__identifiers[i_hash] = (set(i_keys), i_val_keys, "".join(i_no_val_keys), len(i_keys))
-        if i_hash not in self.__identifiers_filter_map:
-            self.__identifiers_filter_map[i_hash] = {filter_id}
+            i_val_keys, i_no_val_keys = i_hash
+            i_keys = i_val_keys + i_no_val_keys
+            self.__shared[i_hash] = i_hash
+            self.__identifiers[i_hash] = (set(i_keys), get_identifier_getter(i_val_keys), self.__identifier_seq, len(i_keys))
+            self.__identifier_seq += 1
+            self.__identifiers_refs[i_hash] = 1
+            self.__identifier_index = self.__identifier_index.add(keys=i_keys, entry=self.__identifiers[i_hash])
+            self.__add_paths(paths=((key,) for key in i_keys))
+            self.__add_flat_paths(items=self.__get_identifier_flat_paths(i_keys))
         else:
-            self.__identifiers_filter_map[i_hash].add(filter_id)
-        return i_hash, "".join([i_values[k] for k in i_val_keys]) + self.__identifiers[i_hash][2]
+            self.__identifiers_refs[i_hash] += 1
+        return self.__shared[i_hash]
 
-    def __del_identifier(self, i_hash: str, filter_id: str):
-        self.__identifiers_filter_map[i_hash].discard(filter_id)
-        if not self.__identifiers_filter_map[i_hash]:
+    def __del_identifier(self, i_hash: typing.Tuple):
+        self.__identifiers_refs[i_hash] -= 1
+        if not self.__identifiers_refs[i_hash]:
+            self.__identifier_index = self.__identifier_index.remove(keys=self.__identifiers[i_hash][0], entry=self.__identifiers[i_hash])
+            self.__del_paths(paths=((key,) for key in self.__identifiers[i_hash][0]))
+            self.__del_flat_paths(src_paths=self.__identifiers[i_hash][0])
             del self.__identifiers[i_hash]
-            del self.__identifiers_filter_map[i_hash]
+            del self.__identifiers_refs[i_hash]
+            del self.__shared[i_hash]
 
-    def __add_source(self, source: str, filter_id: str):
-        self.__sources.add(source)
-        if source not in self.__sources_filter_map:
-            self.__sources_filter_map[source] = {filter_id}
-        else:
-            self.__sources_filter_map[source].add(filter_id)
-
-    def __del_source(self, source: str, filter_id: str):
-        self.__sources_filter_map[source].discard(filter_id)
-        if not self.__sources_filter_map[source]:
-            self.__sources.discard(source)
-            del self.__sources_filter_map[source]
-
-    def __add_filter_metadata(self, filter_id: str, source: str, m_hash: str, i_hash: str, i_str: str, args: typing.Optional[typing.Dict] = None):
-        self.__filter_metadata[filter_id] = {
-            FilterMetadata.source: source,
-            FilterMetadata.m_hash: m_hash,
-            FilterMetadata.i_hash: i_hash,
-            FilterMetadata.i_str: i_str,
-            FilterMetadata.args: args
-        }
-
-    def __del_filter_metadata(self, filter_id: str):
-        del self.__filter_metadata[filter_id]
-
-    def __add(self, source: str, mappings: typing.Dict, id: str, identifiers: typing.Optional[list] = None, args: typing.Optional[typing.Dict] = None):
+    def __add_source(self, source: str):
+        self.__sources_refs[source] = self.__sources_refs.get(source, 0) + 1
+
+    def __del_source(self, source: str):
+        self.__sources_refs[source] -= 1
+        if not self.__sources_refs[source]:
+            del self.__sources_refs[source]
+
+    def __prepare(self, parsed_mappings: typing.Dict, source: str, mappings: typing.Dict, id: str, identifiers: typing.Optional[list] = None, args: typing.Optional[typing.Dict] = None) -> typing.Tuple[str, FilterEntry]:
         validate(source, str, f"filter {Filter.source}")
         validate(mappings, dict, f"filter {Filter.mappings}")
         validate(id, str, f"filter {Filter.id}")
@@ -156,73 +378,458 @@ class FilterHandler:
             validate(identifiers, list, f"filter {Filter.identifiers}")
         if args:
             validate(args, dict, f"filter {Filter.args}")
-        with self.__lock:
-            if id in self.__filter_metadata:
-                raise DuplicateFilterIDError(id)
-            m_hash = hash_mappings(mappings=mappings)
-            if identifiers:
-                i_hash, i_str = self.__add_identifier(identifiers=identifiers, filter_id=id)
-            else:
-                i_hash = None
-                i_str = source
-            self.__add_filter_metadata(
-                filter_id=id,
-                source=source,
-                m_hash=m_hash,
-                i_hash=i_hash,
-                i_str=i_str,
-                args=args
-            )
-            self.__add_mappings(mappings=mappings, m_hash=m_hash, filter_id=id)
-            self.__add_source(source=source, filter_id=id)
-            self.__add_filter(
-                i_str=i_str,
-                m_hash=m_hash,
-                filter_id=id
-            )
+        m_hash = hash_mappings(mappings=mappings)
+        if m_hash not in self.__mappings and m_hash not in parsed_mappings:
+            parsed_mappings[m_hash] = parse_mappings(mappings=mappings)
+        if identifiers:
+            i_hash, i_values = parse_identifiers(identifiers=identifiers)
+            return sys.intern(id), FilterEntry(source=sys.intern(source), m_hash=m_hash, i_hash=i_hash, i_values=i_values, args=args)
+        source = sys.intern(source)
+        return sys.intern(id), FilterEntry(source=source, m_hash=m_hash, i_hash=None, i_str=source, args=args)
+
+    def __prepare_all(self, filters: typing.Iterable[typing.Dict]) -> typing.Tuple[typing.Dict[str, FilterEntry], typing.Dict]:
+        prepared = dict()
+        parsed_mappings = dict()
+        for filter in filters:
+            filter_id, entry = self.__prepare(parsed_mappings, **filter)
+            if filter_id in prepared:
+                raise DuplicateFilterIDError(filter_id)
+            prepared[filter_id] = entry
+        return prepared, parsed_mappings
 
-    def __identify_msg(self, msg: typing.Dict):
+    def __add(self, filter_id: str, entry: FilterEntry, parsed_mappings: typing.Dict) -> typing.Hashable:
+        self.__filter_entries[filter_id] = entry
+        if entry.i_hash:
+            entry.i_hash = self.__add_identifier(i_hash=entry.i_hash)
+            entry.i_str = (self.__identifiers[entry.i_hash][2], entry.i_values)
+        entry.m_hash = self.__add_mappings(m_hash=entry.m_hash, parsed_mappings=parsed_mappings.get(entry.m_hash))
+        self.__add_source(source=entry.source)
+        entry.i_str = self.__add_filter(
+            i_str=entry.i_str,
+            m_hash=entry.m_hash,
+            filter_id=filter_id,
+            entry=entry
+        )
+        return entry.i_str
+
+    def __delete(self, filter_id: str, parsed_mappings: typing.Optional[typing.Dict] = None) -> typing.Hashable:
+        entry = self.__filter_entries.pop(filter_id)
+        if entry.i_hash:
+            self.__del_identifier(i_hash=entry.i_hash)
+        self.__del_mappings(m_hash=entry.m_hash, parsed_mappings=parsed_mappings)
+        self.__del_source(source=entry.source)
+        self.__del_filter(
+            i_str=entry.i_str,
+            m_hash=entry.m_hash,
+            filter_id=filter_id
+        )
+        return entry.i_str
+
+    @staticmethod
+    def __identify_msg(snapshot: RoutingSnapshot, msg: typing.Dict):
         try:
-            msg_keys = set(msg.keys())
-            identifier = None
-            for i_hash in self.__identifiers:
-                if self.__identifiers[i_hash][0].issubset(msg_keys):
-                    if not identifier:
-                        identifier = self.__identifiers[i_hash]
-                    else:
-                        if self.__identifiers[i_hash][3] > identifier[3]:
-                            identifier = self.__identifiers[i_hash]
+            identifier = snapshot.identifiers.lookup(msg=msg)
             if identifier:
-                return "".join([str(msg[key]) for key in identifier[1]]) + identifier[2]
+                if identifier[1] is None:
+                    return identifier[2], ()
+                i_str = (identifier[2], identifier[1](msg))
+                try:
+                    hash(i_str)
+                except TypeError:
+                    return None
+                if snapshot.predicates:
+                    predicates = snapshot.predicates.get(identifier[2])
+                    if predicates is not None:
+                        matched = predicates.match(i_str[1])
+                        if matched:
+                            if snapshot.filters.get(i_str) is not None:
+                                return MatchKey((i_str,) + matched)
+                            return matched[0] if len(matched) == 1 else MatchKey(matched)
+                return i_str
         except Exception as ex:
             raise mf_lib.exceptions.MessageIdentificationError(ex)
 
-    def get_results(self, message: typing.Dict, source: typing.Optional[str] = None, data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False) -> typing.Generator[FilterResult, None, None]:
+    @staticmethod
+    def __get_result(mappings: typing.Dict, filter_ids: typing.Tuple, message: typing.Dict, data_builder: typing.Callable[[typing.Generator], typing.Any], extra_builder: typing.Callable[[typing.Generator], typing.Any], data_ignore_missing_keys: bool, extra_ignore_missing_keys: bool, args: typing.Optional[typing.Dict] = None, map_msg: typing.Callable[..., typing.Generator] = mapper) -> FilterResult:
+        try:
+            return FilterResult(
+                data=mappings[MappingType.data].build(builder=data_builder, msg=message, ignore_missing=data_ignore_missing_keys, map_msg=map_msg),
+                extra=mappings[MappingType.extra].build(builder=extra_builder, msg=message, ignore_missing=extra_ignore_missing_keys, map_msg=map_msg),
+                filter_ids=filter_ids,
+                args=args
+            )
+        except Exception as ex:
+            return FilterResult(filter_ids=filter_ids, ex=ex, args=args)
+
+    @staticmethod
+    def __get_result_metered(metrics: Metrics, m_hash: typing.FrozenSet, **kwargs) -> FilterResult:
+        start = time.perf_counter_ns()
+        result = FilterHandler.__get_result(**kwargs)
+        metrics.count_result(m_hash=m_hash, filter_ids=result.filter_ids, failed=result.ex is not None, duration=time.perf_counter_ns() - start)
+        return result
+
+    @staticmethod
+    def __identify_msg_metered(metrics: Metrics, snapshot: RoutingSnapshot, msg: typing.Dict, source: typing.Optional[str]):
+        start = time.perf_counter_ns()
+        try:
+            i_str = FilterHandler.__identify_msg(snapshot=snapshot, msg=msg) or source
+        except mf_lib.exceptions.MessageIdentificationError:
+            metrics.count_identification_error(source=source)
+            raise
+        metrics.identification.observe(time.perf_counter_ns() - start)
+        return i_str
+
+    def __count_miss(self, source: typing.Optional[str]):
+        self.__miss_counts[source] = self.__miss_counts.get(source, 0) + 1
+
+    def __get_results(self, snapshot: RoutingSnapshot, message: typing.Dict, source: typing.Optional[str], data_builder: typing.Callable[[typing.Generator], typing.Any], extra_builder: typing.Callable[[typing.Generator], typing.Any], data_ignore_missing_keys: bool, extra_ignore_missing_keys: bool, ignore_no_filter: bool, include_args: bool, map_msg: typing.Callable[..., typing.Generator], lazy: bool = False) -> typing.Generator[FilterResult, None, None]:
+        i_str = self.__identify_msg(snapshot=snapshot, msg=message) or source
+        groups = snapshot.get_groups(i_str)
+        if groups:
+            for group in groups:
+                m_hash, filter_ids, mappings = group.m_hash, group.filter_ids, group.mappings
+                args = group.args if include_args else None
+                if lazy:
+                    yield LazyFilterResult(
+                        evaluate=functools.partial(
+                            self.__get_result,
+                            mappings=mappings,
+                            filter_ids=filter_ids,
+                            message=message,
+                            data_builder=data_builder,
+                            extra_builder=extra_builder,
+                            data_ignore_missing_keys=data_ignore_missing_keys,
+                            extra_ignore_missing_keys=extra_ignore_missing_keys,
+                            args=args,
+                            map_msg=map_msg
+                        ),
+                        filter_ids=filter_ids,
+                        args=args
+                    )
+                    continue
+                yield self.__get_result(
+                    mappings=mappings,
+                    filter_ids=filter_ids,
+                    message=message,
+                    data_builder=data_builder,
+                    extra_builder=extra_builder,
+                    data_ignore_missing_keys=data_ignore_missing_keys,
+                    extra_ignore_missing_keys=extra_ignore_missing_keys,
+                    args=args,
+                    map_msg=map_msg
+                )
+        else:
+            self.__count_miss(source)
+            if not ignore_no_filter:
+                raise mf_lib.exceptions.NoFilterError()
+
+    @staticmethod
+    def __get_result_traced(hook: typing.Callable[[Span], None], seq: int, source: typing.Optional[str], i_str: str, m_hash: typing.FrozenSet, mappings: typing.Dict, filter_ids: typing.Tuple, message: typing.Dict, data_builder: typing.Callable[[typing.Generator], typing.Any], extra_builder: typing.Callable[[typing.Generator], typing.Any], data_ignore_missing_keys: bool, extra_ignore_missing_keys: bool, args: typing.Optional[typing.Dict] = None, map_msg: typing.Callable[..., typing.Generator] = mapper) -> FilterResult:
+        built = dict()
+        try:
+            for m_type, builder, ignore_missing in ((MappingType.data, data_builder, data_ignore_missing_keys), (MappingType.extra, extra_builder, extra_ignore_missing_keys)):
+                start = time.perf_counter_ns()
+                try:
+                    items = tuple(map_msg(mappings=mappings[m_type], msg=message, ignore_missing=ignore_missing))
+                finally:
+                    end = time.perf_counter_ns()
+                    hook(Span(seq=seq, stage=Stage.extraction, start_ns=start, duration_ns=end - start, source=source, i_str=i_str, m_hash=m_hash, filter_ids=filter_ids, m_type=m_type))
+                try:
+                    built[m_type] = builder(iter(items))
+                finally:
+                    start, end = end, time.perf_counter_ns()
+                    hook(Span(seq=seq, stage=Stage.build, start_ns=start, duration_ns=end - start, source=source, i_str=i_str, m_hash=m_hash, filter_ids=filter_ids, m_type=m_type))
+            return FilterResult(data=built[MappingType.data], extra=built[MappingType.extra], filter_ids=filter_ids, args=args)
+        except Exception as ex:
+            return FilterResult(filter_ids=filter_ids, ex=ex, args=args)
+
+    def __get_results_instrumented(self, snapshot: RoutingSnapshot, message: typing.Dict, source: typing.Optional[str], data_builder: typing.Callable[[typing.Generator], typing.Any], extra_builder: typing.Callable[[typing.Generator], typing.Any], data_ignore_missing_keys: bool, extra_ignore_missing_keys: bool, ignore_no_filter: bool, include_args: bool, map_msg: typing.Callable[..., typing.Generator], lazy: bool = False) -> typing.Generator[FilterResult, None, None]:
+        metrics = self.__metrics
+        tracing = self.__tracing
+        seq = tracing.sample() if tracing is not None else None
+        if seq is None:
+            if metrics is None:
+                yield from self.__get_results(snapshot, message, source, data_builder, extra_builder, data_ignore_missing_keys, extra_ignore_missing_keys, ignore_no_filter, include_args, map_msg, lazy)
+                return
+            i_str = self.__identify_msg_metered(metrics=metrics, snapshot=snapshot, msg=message, source=source)
+            groups = snapshot.get_groups(i_str)
+        else:
+            hook = tracing.hook
+            start = time.perf_counter_ns()
+            try:
+                i_str = self.__identify_msg(snapshot=snapshot, msg=message) or source
+            except mf_lib.exceptions.MessageIdentificationError:
+                if metrics is not None:
+                    metrics.count_identification_error(source=source)
+                raise
+            end = time.perf_counter_ns()
+            if metrics is not None:
+                metrics.identification.observe(end - start)
+            hook(Span(seq=seq, stage=Stage.identification, start_ns=start, duration_ns=end - start, source=source, i_str=i_str))
+            groups = snapshot.get_groups(i_str)
+            start, end = end, time.perf_counter_ns()
+            hook(Span(seq=seq, stage=Stage.lookup, start_ns=start, duration_ns=end - start, source=source, i_str=i_str))
+        if metrics is not None:
+            metrics.count_message(source=source, i_str=i_str, matched=bool(groups))
+        if groups:
+            for group in groups:
+                m_hash, filter_ids, mappings = group.m_hash, group.filter_ids, group.mappings
+                args = group.args if include_args else None
+                kwargs = dict(
+                    mappings=mappings,
+                    filter_ids=filter_ids,
+                    message=message,
+                    data_builder=data_builder,
+                    extra_builder=extra_builder,
+                    data_ignore_missing_keys=data_ignore_missing_keys,
+                    extra_ignore_missing_keys=extra_ignore_missing_keys,
+                    args=args,
+                    map_msg=map_msg
+                )
+                if seq is None:
+                    if lazy:
+                        yield LazyFilterResult(evaluate=functools.partial(self.__get_result_metered, metrics=metrics, m_hash=m_hash, **kwargs), filter_ids=filter_ids, args=kwargs["args"])
+                    else:
+                        yield self.__get_result_metered(metrics=metrics, m_hash=m_hash, **kwargs)
+                else:
+                    start = time.perf_counter_ns()
+                    result = self.__get_result_traced(hook=hook, seq=seq, source=source, i_str=i_str, m_hash=m_hash, **kwargs)
+                    if metrics is not None:
+                        metrics.count_result(m_hash=m_hash, filter_ids=filter_ids, failed=result.ex is not None, duration=time.perf_counter_ns() - start)
+                    yield result
+        else:
+            self.__count_miss(source)
+            if not ignore_no_filter:
+                raise mf_lib.exceptions.NoFilterError()
+
+    def __get_results_func(self) -> typing.Callable[..., typing.Generator[FilterResult, None, None]]:
+        if self.__metrics is None and self.__tracing is None:
+            return self.__get_results
+        return self.__get_results_instrumented
+
+    def __group_messages(self, snapshot: RoutingSnapshot, messages: typing.Sequence[typing.Dict], sources: typing.Optional[typing.Union[str, typing.Sequence[str]]], batch_result: BatchResult, ignore_no_filter: bool) -> typing.Dict[str, typing.List[int]]:
+        single_source = sources is None or isinstance(sources, str)
+        metrics = self.__metrics
+        i_str_map = dict()
+        for pos, message in enumerate(messages):
+            source = sources if single_source else sources[pos]
+            try:
+                if metrics is None:
+                    i_str = self.__identify_msg(snapshot=snapshot, msg=message) or source
+                else:
+                    i_str = self.__identify_msg_metered(metrics=metrics, snapshot=snapshot, msg=message, source=source)
+            except mf_lib.exceptions.MessageIdentificationError as ex:
+                batch_result.errors[pos] = ex
+                continue
+            matched = bool(snapshot.get_groups(i_str))
+            if metrics is not None:
+                metrics.count_message(source=source, i_str=i_str, matched=matched)
+            if matched:
+                if i_str not in i_str_map:
+                    i_str_map[i_str] = [pos]
+                else:
+                    i_str_map[i_str].append(pos)
+            else:
+                self.__count_miss(source)
+                if not ignore_no_filter:
+                    batch_result.errors[pos] = mf_lib.exceptions.NoFilterError()
+        return i_str_map
+
+    def get_results(self, message: typing.Dict, source: typing.Optional[str] = None, data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, ignore_no_filter: bool = False, include_args: bool = False, flat: bool = False, lazy: bool = False) -> typing.Generator[FilterResult, None, None]:
         """
         Generator that applies filters to a message and yields extracted data.
-        :param message: Dictionary containing message data.
+        :param message: Dictionary containing message data or, if flat is True, values by source path.
         :param source: Message source.
         :param data_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
         :param extra_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
         :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
         :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param ignore_no_filter: Yield nothing instead of raising NoFilterError if no filters apply. Default is False.
+        :param include_args: Store filter arguments by filter ID in FilterResult.args. Default is False.
+        :param flat: Message is a flat dictionary with source paths as keys, e.g. created by flatten_message. Default is False.
+        :param lazy: Yield LazyFilterResult objects that extract data on first access. Default is False.
         :returns: FilterResult objects.
         """
-        with self.__lock:
-            i_str = self.__identify_msg(msg=message) or source
-            if i_str in self.__filters:
-                for m_hash in self.__filters[i_str]:
-                    filter_ids = tuple(self.__filters[i_str][m_hash])
-                    try:
-                        yield FilterResult(
-                            data=data_builder(mapper(mappings=self.__mappings[m_hash][MappingType.data], msg=message, ignore_missing=data_ignore_missing_keys)),
-                            extra=extra_builder(mapper(mappings=self.__mappings[m_hash][MappingType.extra], msg=message, ignore_missing=extra_ignore_missing_keys)),
-                            filter_ids=filter_ids
+        return self.__get_results_func()(
+            snapshot=self.__snapshot,
+            message=message,
+            source=source,
+            data_builder=data_builder,
+            extra_builder=extra_builder,
+            data_ignore_missing_keys=data_ignore_missing_keys,
+            extra_ignore_missing_keys=extra_ignore_missing_keys,
+            ignore_no_filter=ignore_no_filter,
+            include_args=include_args,
+            map_msg=flat_mapper if flat else mapper,
+            lazy=lazy
+        )
+
+    def get_results_from_bytes(self, payload: typing.Union[bytes, bytearray, str], source: typing.Optional[str] = None, data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, ignore_no_filter: bool = False, include_args: bool = False, lazy: bool = False) -> typing.Generator[FilterResult, None, None]:
+        """
+        Generator that decodes a JSON message and applies filters. Only message members referenced by identifiers and
+        mappings are decoded, all other members are skipped.
+        :param payload: UTF-8 encoded JSON document.
+        :param source: Message source.
+        :param data_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param extra_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param ignore_no_filter: Yield nothing instead of raising NoFilterError if no filters apply. Default is False.
+        :param include_args: Store filter arguments by filter ID in FilterResult.args. Default is False.
+        :param lazy: Yield LazyFilterResult objects that extract data on first access. Default is False.
+        :returns: FilterResult objects.
+        """
+        snapshot = self.__snapshot
+        try:
+            message = decode_paths(payload=payload, tree=snapshot.paths.tree)
+        except Exception as ex:
+            raise mf_lib.exceptions.MessageDecodeError(ex)
+        return self.__get_results_func()(
+            snapshot=snapshot,
+            message=message,
+            source=source,
+            data_builder=data_builder,
+            extra_builder=extra_builder,
+            data_ignore_missing_keys=data_ignore_missing_keys,
+            extra_ignore_missing_keys=extra_ignore_missing_keys,
+            ignore_no_filter=ignore_no_filter,
+            include_args=include_args,
+            map_msg=mapper,
+            lazy=lazy
+        )
+
+    def get_results_batch(self, messages: typing.Sequence[typing.Dict], sources: typing.Optional[typing.Union[str, typing.Sequence[str]]] = None, data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, ignore_no_filter: bool = False, include_args: bool = False, flat: bool = False, lazy: bool = False) -> BatchResult:
+        """
+        Applies filters to multiple messages and groups extracted data by filters.
+        :param messages: Sequence of dictionaries containing message data or, if flat is True, values by source path.
+        :param sources: Source of all messages or a sequence containing the source of each message.
+        :param data_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param extra_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param ignore_no_filter: Skip messages without filters instead of storing a NoFilterError. Default is False.
+        :param include_args: Store filter arguments by filter ID in FilterResult.args. Default is False.
+        :param flat: Messages are flat dictionaries with source paths as keys. Default is False.
+        :param lazy: Store LazyFilterResult objects that extract data on first access. Default is False.
+        :returns: BatchResult object containing FilterResultGroup objects and errors (NoFilterError, MessageIdentificationError) by message index.
+        """
+        batch_result = BatchResult()
+        snapshot = self.__snapshot
+        metrics = self.__metrics
+        for i_str, positions in self.__group_messages(snapshot=snapshot, messages=messages, sources=sources, batch_result=batch_result, ignore_no_filter=ignore_no_filter).items():
+            for filter_group in snapshot.get_groups(i_str):
+                m_hash, filter_ids, mappings, args = filter_group.m_hash, filter_group.filter_ids, filter_group.mappings, filter_group.args
+                group = FilterResultGroup(filter_ids=filter_ids, args=args)
+                result_args = args if include_args else None
+                map_msg = flat_mapper if flat else mapper
+                for pos in positions:
+                    if lazy:
+                        result = LazyFilterResult(
+                            evaluate=functools.partial(
+                                self.__get_result if metrics is None else functools.partial(self.__get_result_metered, metrics=metrics, m_hash=m_hash),
+                                mappings=mappings,
+                                filter_ids=filter_ids,
+                                message=messages[pos],
+                                data_builder=data_builder,
+                                extra_builder=extra_builder,
+                                data_ignore_missing_keys=data_ignore_missing_keys,
+                                extra_ignore_missing_keys=extra_ignore_missing_keys,
+                                args=result_args,
+                                map_msg=map_msg
+                            ),
+                            filter_ids=filter_ids,
+                            args=result_args
+                        )
+                    elif metrics is None:
+                        result = self.__get_result(
+                            mappings=mappings,
+                            filter_ids=filter_ids,
+                            message=messages[pos],
+                            data_builder=data_builder,
+                            extra_builder=extra_builder,
+                            data_ignore_missing_keys=data_ignore_missing_keys,
+                            extra_ignore_missing_keys=extra_ignore_missing_keys,
+                            args=result_args,
+                            map_msg=map_msg
+                        )
+                    else:
+                        result = self.__get_result_metered(
+                            metrics=metrics,
+                            m_hash=m_hash,
+                            mappings=mappings,
+                            filter_ids=filter_ids,
+                            message=messages[pos],
+                            data_builder=data_builder,
+                            extra_builder=extra_builder,
+                            data_ignore_missing_keys=data_ignore_missing_keys,
+                            extra_ignore_missing_keys=extra_ignore_missing_keys,
+                            args=result_args,
+                            map_msg=map_msg
                         )
+                    group.results.append(result)
+                    group.indices.append(pos)
+                batch_result.groups.append(group)
+        return batch_result
+
+    def get_columns_batch(self, messages: typing.Sequence[typing.Dict], sources: typing.Optional[typing.Union[str, typing.Sequence[str]]] = None, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, ignore_no_filter: bool = False, flat: bool = False) -> BatchResult:
+        """
+        Applies filters to multiple messages and collects extracted data in one column per destination path and
+        filter group. Missing values are stored as None, use ColumnBuffer.to_arrays to get NumPy arrays.
+        :param messages: Sequence of dictionaries containing message data or, if flat is True, values by source path.
+        :param sources: Source of all messages or a sequence containing the source of each message.
+        :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param ignore_no_filter: Skip messages without filters instead of storing a NoFilterError. Default is False.
+        :param flat: Messages are flat dictionaries with source paths as keys. Default is False.
+        :returns: BatchResult object containing ColumnGroup objects and errors (NoFilterError, MessageIdentificationError) by message index.
+        """
+        batch_result = BatchResult()
+        snapshot = self.__snapshot
+        metrics = self.__metrics
+        for i_str, positions in self.__group_messages(snapshot=snapshot, messages=messages, sources=sources, batch_result=batch_result, ignore_no_filter=ignore_no_filter).items():
+            for filter_group in snapshot.get_groups(i_str):
+                m_hash, filter_ids, mappings, args = filter_group.m_hash, filter_group.filter_ids, filter_group.mappings, filter_group.args
+                group = ColumnGroup(filter_ids=filter_ids, mappings=mappings, args=args)
+                data_mappings = mappings[MappingType.data]
+                extra_mappings = mappings[MappingType.extra]
+                map_msg = flat_mapper if flat else mapper
+                for pos in positions:
+                    message = messages[pos]
+                    size = group.data.size
+                    if metrics is not None:
+                        start = time.perf_counter_ns()
+                    try:
+                        group.data.append(map_msg(mappings=data_mappings, msg=message, ignore_missing=data_ignore_missing_keys))
+                        group.extra.append(map_msg(mappings=extra_mappings, msg=message, ignore_missing=extra_ignore_missing_keys))
                     except Exception as ex:
-                        yield FilterResult(filter_ids=filter_ids, ex=ex)
-            else:
-                raise mf_lib.exceptions.NoFilterError()
+                        group.data.truncate(size)
+                        group.errors[pos] = ex
+                        if metrics is not None:
+                            metrics.count_result(m_hash=m_hash, filter_ids=filter_ids, failed=True, duration=time.perf_counter_ns() - start)
+                        continue
+                    if metrics is not None:
+                        metrics.count_result(m_hash=m_hash, filter_ids=filter_ids, failed=False, duration=time.perf_counter_ns() - start)
+                    group.indices.append(pos)
+                batch_result.groups.append(group)
+        return batch_result
+
+    def flatten_message(self, message: typing.Dict) -> typing.Dict[str, typing.Any]:
+        """
+        Create a flat dictionary for use with flat=True. Only source paths referenced by mappings and identifier keys
+        are resolved, missing paths are omitted.
+        :param message: Dictionary containing message data.
+        :return: Dictionary containing values by source path.
+        """
+        return self.__snapshot.paths.flatten(obj=message)
+
+    def identify_message(self, message: typing.Dict, source: typing.Optional[str] = None) -> typing.Hashable:
+        """
+        Get the identification key of a message. Messages with equal keys are handled by the same filters.
+        :param message: Dictionary containing message data.
+        :param source: Message source.
+        :return: Identification key of the message.
+        """
+        return self.__identify_msg(snapshot=self.__snapshot, msg=message) or source
 
     def add_filter(self, filter: typing.Dict):
         """
@@ -230,8 +837,23 @@ class FilterHandler:
         :param filter: Dictionary containing filter data.
         :return: None
         """
+        self.add_filters(filters=(filter,))
+
+    def add_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Add multiple filters. Filters are only added if all filters are valid.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
         try:
-            self.__add(**filter)
+            with self.__lock:
+                prepared, parsed_mappings = self.__prepare_all(filters=filters)
+                for filter_id in prepared:
+                    if filter_id in self.__filter_entries:
+                        raise DuplicateFilterIDError(filter_id)
+                for filter_id, entry in prepared.items():
+                    self.__add(filter_id, entry, parsed_mappings)
+                self.__publish()
         except Exception as ex:
             raise mf_lib.exceptions.AddFilterError(ex)
 
@@ -241,26 +863,178 @@ class FilterHandler:
         :param id: ID of a filter to be deleted.
         :return: None
         """
+        self.delete_filters(ids=(id,))
+
+    def delete_filters(self, ids: typing.Iterable[str]):
+        """
+        Delete multiple filters. Filters are only deleted if all IDs are known.
+        :param ids: Iterable of IDs of filters to be deleted.
+        :return: None
+        """
         try:
-            validate(id, str, "id")
+            ids = set(ids)
+            for id in ids:
+                validate(id, str, "id")
             with self.__lock:
-                if id in self.__filter_metadata:
-                    filter_md = self.__filter_metadata[id]
-                    self.__del_filter_metadata(filter_id=id)
-                    if filter_md[FilterMetadata.i_hash]:
-                        self.__del_identifier(i_hash=filter_md[FilterMetadata.i_hash], filter_id=id)
-                    self.__del_mappings(m_hash=filter_md[FilterMetadata.m_hash], filter_id=id)
-                    self.__del_source(source=filter_md[FilterMetadata.source], filter_id=id)
-                    self.__del_filter(
-                        i_str=filter_md[FilterMetadata.i_str],
-                        m_hash=filter_md[FilterMetadata.m_hash],
-                        filter_id=id
-                    )
-                else:
-                    raise mf_lib.exceptions.UnknownFilterIDError(filter_id=id)
+                for id in ids:
+                    if id not in self.__filter_entries:
+                        raise mf_lib.exceptions.UnknownFilterIDError(filter_id=id)
+                for id in ids:
+                    self.__delete(filter_id=id)
+                self.__publish()
         except Exception as ex:
             raise mf_lib.exceptions.DeleteFilterError(ex)
 
+    def replace_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Replace all filters with the provided filters. Only new, changed and removed filters are applied and all
+        changes become visible at once. Nothing is changed if a filter is invalid.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
+        try:
+            with self.__lock:
+                prepared, parsed_mappings = self.__prepare_all(filters=filters)
+                for filter_id in tuple(self.__filter_entries):
+                    if filter_id not in prepared or prepared[filter_id] != self.__filter_entries[filter_id]:
+                        self.__delete(filter_id=filter_id, parsed_mappings=parsed_mappings)
+                for filter_id, entry in prepared.items():
+                    if filter_id not in self.__filter_entries:
+                        self.__add(filter_id, entry, parsed_mappings)
+                self.__publish()
+        except Exception as ex:
+            raise mf_lib.exceptions.ReplaceFiltersError(ex)
+
+    def save_state(self, path: str):
+        """
+        Save identifiers, parsed mappings, filter groups and filter metadata to a versioned binary file.
+        :param path: Path of the file.
+        :return: None
+        """
+        try:
+            with self.__lock:
+                state = {
+                    State.identifiers: self.__identifiers,
+                    State.identifier_index: self.__identifier_index,
+                    State.filters: self.__filters,
+                    State.filter_groups: dict(self.__snapshot.filters.items()),
+                    State.mappings: self.__mappings,
+                    State.filter_entries: self.__filter_entries,
+                    State.mappings_refs: self.__mappings_refs,
+                    State.identifiers_refs: self.__identifiers_refs,
+                    State.sources_refs: self.__sources_refs
+                }
+                with open(path, "wb") as file:
+                    dump_state(state=state, file=file)
+        except Exception as ex:
+            raise mf_lib.exceptions.SaveStateError(ex)
+
+    def load_state(self, path: str):
+        """
+        Replace all filters with the state stored in a file created by save_state. Filters are not validated again,
+        only files from trusted sources must be loaded.
+        :param path: Path of the file.
+        :return: None
+        """
+        try:
+            with open(path, "rb") as file:
+                state = load_state(file=file)
+            with self.__lock:
+                self.__identifiers = state[State.identifiers]
+                self.__identifier_index = state[State.identifier_index]
+                self.__filters = state[State.filters]
+                self.__group_changes.clear()
+                self.__mappings = state[State.mappings]
+                self.__filter_entries = state[State.filter_entries]
+                self.__mappings_refs = state[State.mappings_refs]
+                self.__identifiers_refs = state[State.identifiers_refs]
+                self.__sources_refs = state[State.sources_refs]
+                self.__shared = {key: key for key in self.__mappings}
+                self.__shared.update((key, key) for key in self.__identifiers)
+                self.__shared.update((key, key) for key in self.__filters)
+                self.__identifier_seq = max((identifier[2] + 1 for identifier in self.__identifiers.values()), default=0)
+                self.__paths = dict()
+                self.__flat_paths = dict()
+                for parsed_mappings in self.__mappings.values():
+                    self.__add_paths(paths=self.__get_mappings_paths(parsed_mappings))
+                    self.__add_flat_paths(items=self.__get_mappings_flat_paths(parsed_mappings))
+                for identifier in self.__identifiers.values():
+                    self.__add_paths(paths=((key,) for key in identifier[0]))
+                    self.__add_flat_paths(items=self.__get_identifier_flat_paths(identifier[0]))
+                self.__path_set = PathSet().update(paths=dict.fromkeys(self.__paths, True), getters={src_path: getter for src_path, (count, getter) in self.__flat_paths.items()})
+                self.__path_changes.clear()
+                self.__flat_path_changes.clear()
+                self.__predicate_changes.clear()
+                for i_str in self.__filters:
+                    if isinstance(i_str, tuple) and has_predicates(i_str[1]):
+                        self.__predicate_changes.setdefault(i_str[0], dict())[i_str] = self.__predicate_seq
+                        self.__predicate_seq += 1
+                predicates = update_mapping(mapping=dict(), items={set_id: PredicateIndex(keys=dict()).update(keys=keys) for set_id, keys in self.__predicate_changes.items()})
+                self.__predicate_changes.clear()
+                self.__snapshot = RoutingSnapshot(identifiers=self.__get_identifiers(), filters=SnapshotMap().update(state[State.filter_groups]), paths=self.__path_set, predicates=predicates)
+        except Exception as ex:
+            raise mf_lib.exceptions.LoadStateError(ex)
+
+    def get_identification_cache_info(self) -> typing.Optional[typing.Dict[str, int]]:
+        """
+        Get counters of the identification cache. Counters are kept when the cache is invalidated by filter changes.
+        :return: Dictionary containing hits, misses, size and maxsize or None if the cache is disabled.
+        """
+        if self.__identification_cache_size:
+            return self.__snapshot.identifiers.info()
+
+    def set_trace_hook(self, hook: typing.Optional[typing.Callable[[Span], None]], sample_rate: int = 1):
+        """
+        Install a hook that receives a Span object for every stage (identification, lookup, extraction, build) of
+        applying filters via get_results and get_results_from_bytes. Only every sample_rate-th message is traced.
+        :param hook: Callable receiving Span objects, None removes an installed hook.
+        :param sample_rate: Trace 1 in sample_rate messages. Default is 1.
+        :return: None
+        """
+        self.__tracing = Tracing(hook=hook, sample_rate=sample_rate) if hook is not None else None
+
+    def get_stats(self, reset: bool = False) -> typing.Optional[typing.Dict]:
+        """
+        Get a snapshot of the metrics collected while applying filters.
+        :param reset: Reset counters and histograms after creating the snapshot. Default is False.
+        :return: Dictionary containing message counts by source and identification string, result and error counts by filter ID and mappings hash, identification cache counters and latency histograms or None if metrics are disabled.
+        """
+        if self.__metrics is None:
+            return None
+        stats = self.__metrics.get_stats()
+        stats[Stats.identification_cache] = self.get_identification_cache_info()
+        if reset:
+            self.__metrics.reset()
+        return stats
+
+    def get_miss_counts(self) -> typing.Dict[typing.Optional[str], int]:
+        """
+        Get the number of messages without filters by message source.
+        :return: Dictionary containing counts by source.
+        """
+        return self.__miss_counts.copy()
+
+    def memory_usage(self) -> typing.Dict[str, int]:
+        """
+        Get the memory used by filters broken down by structure. Objects shared by several structures are counted once
+        for the first structure they are found in.
+        :return: Dictionary containing sizes in bytes by structure and the total size.
+        """
+        with self.__lock:
+            seen = set()
+            usage = {
+                Memory.filter_entries: get_size(self.__filter_entries, seen),
+                Memory.filters: get_size(self.__filters, seen),
+                Memory.mappings: get_size(self.__mappings, seen),
+                Memory.identifiers: get_size(self.__identifiers, seen),
+                Memory.identifier_index: get_size((self.__identifier_index, self.__snapshot.predicates), seen),
+                Memory.refs: get_size((self.__mappings_refs, self.__identifiers_refs, self.__sources_refs, self.__shared), seen),
+                Memory.paths: get_size((self.__paths, self.__flat_paths, self.__path_set), seen),
+                Memory.filter_groups: get_size(self.__snapshot.filters, seen)
+            }
+        usage[Memory.total] = sum(usage.values())
+        return usage
+
     def get_filter_args(self, id: str) -> typing.Dict:
         """
         Get filter arguments.
@@ -268,8 +1042,8 @@ class FilterHandler:
         :return: Dictionary containing args of a filter.
         """
         validate(id, str, "id")
-        if id in self.__filter_metadata:
-            return self.__filter_metadata[id][FilterMetadata.args]
+        if id in self.__filter_entries:
+            return self.__filter_entries[id].args
         else:
             raise mf_lib.exceptions.UnknownFilterIDError(filter_id=id)
 
@@ -278,4 +1052,4 @@ class FilterHandler:
         Get all sources added by filters.
         :return: List containing sources.
         """
-        return list(self.__sources)
+        return list(self.__sources_refs)
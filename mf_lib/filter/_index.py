@@ -0,0 +1,456 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import functools
+import bisect
+import math
+import typing
+
+
+class SnapshotMap:
+    """
+    Immutable mapping split into buckets that are stored in a two level table. Updates return a new mapping that only
+    copies touched buckets and tables, so the cost of an update does not grow with the total number of items.
+    """
+    __slots__ = ("tables", "size")
+    table_size = 64
+    table_mask = table_size - 1
+    table_shift = 6
+
+    def __init__(self, tables: typing.Optional[typing.Tuple] = None, size: int = 0):
+        self.tables = tables or (None,) * SnapshotMap.table_size
+        self.size = size
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        key_hash = hash(key)
+        table = self.tables[key_hash & SnapshotMap.table_mask]
+        if table:
+            bucket = table[(key_hash >> SnapshotMap.table_shift) & SnapshotMap.table_mask]
+            if bucket:
+                return bucket.get(key, default)
+        return default
+
+    def update(self, items: typing.Dict[typing.Hashable, typing.Any]) -> "SnapshotMap":
+        """
+        Create a new mapping with updated items.
+        :param items: Dictionary containing new values, a value of None removes the corresponding key.
+        :return: SnapshotMap object.
+        """
+        tables = dict()
+        size = self.size
+        for key, value in items.items():
+            key_hash = hash(key)
+            t_pos = key_hash & SnapshotMap.table_mask
+            b_pos = (key_hash >> SnapshotMap.table_shift) & SnapshotMap.table_mask
+            if t_pos not in tables:
+                tables[t_pos] = list(self.tables[t_pos] or (None,) * SnapshotMap.table_size), set()
+            table, copied = tables[t_pos]
+            if b_pos not in copied:
+                table[b_pos] = table[b_pos].copy() if table[b_pos] else dict()
+                copied.add(b_pos)
+            bucket = table[b_pos]
+            if value is None:
+                if key in bucket:
+                    del bucket[key]
+                    size -= 1
+            else:
+                if key not in bucket:
+                    size += 1
+                bucket[key] = value
+        new_tables = list(self.tables)
+        for t_pos, (table, copied) in tables.items():
+            for b_pos in copied:
+                if not table[b_pos]:
+                    table[b_pos] = None
+            new_tables[t_pos] = tuple(table) if any(table) else None
+        return SnapshotMap(tables=tuple(new_tables), size=size)
+
+    def items(self) -> typing.Generator:
+        for table in self.tables:
+            if table:
+                for bucket in table:
+                    if bucket:
+                        yield from bucket.items()
+
+    def __len__(self):
+        return self.size
+
+
+def update_mapping(mapping: typing.Union[typing.Dict, SnapshotMap], items: typing.Dict, max_size: int = 64) -> typing.Union[typing.Dict, SnapshotMap]:
+    """
+    Create an updated copy of a dictionary or SnapshotMap. Dictionaries are copied and converted to a SnapshotMap
+    once they exceed max_size, so the cost of an update does not grow with the number of items.
+    :param mapping: Dictionary or SnapshotMap object.
+    :param items: Dictionary containing new values, a value of None removes the corresponding key.
+    :param max_size: Maximum number of items stored in a dictionary.
+    :return: Dictionary or SnapshotMap object.
+    """
+    if type(mapping) is SnapshotMap:
+        return mapping.update(items)
+    mapping = mapping.copy()
+    for key, value in items.items():
+        if value is None:
+            mapping.pop(key, None)
+        else:
+            mapping[key] = value
+    if len(mapping) > max_size:
+        return SnapshotMap().update(mapping)
+    return mapping
+
+
+class IndexNode:
+    """
+    Node of an identifier index. Children are stored in a dictionary or, for large nodes, a SnapshotMap.
+    """
+    __slots__ = ("children", "entries")
+
+    def __init__(self, children: typing.Optional[typing.Union[typing.Dict, SnapshotMap]] = None, entries: typing.Tuple = ()):
+        self.children = dict() if children is None else children
+        self.entries = entries
+
+
+class IdentifierIndex:
+    """
+    Key presence discrimination tree. Every identifier key set is stored as a path of sorted keys, lookups only
+    descend into branches whose keys are present in a message.
+    Instances are immutable, adding or removing a key set returns a new index that shares all untouched nodes.
+    """
+    def __init__(self, root: typing.Optional[IndexNode] = None, keys: typing.Optional[typing.Union[typing.Dict[str, int], SnapshotMap]] = None, seq: int = 0):
+        self.__root = root or IndexNode()
+        self.__keys = dict() if keys is None else keys
+        self.__seq = seq
+
+    def add(self, keys: typing.Iterable[str], entry: typing.Any) -> "IdentifierIndex":
+        keys = sorted(keys)
+        path = [self.__root]
+        for key in keys:
+            path.append(path[-1] and path[-1].children.get(key))
+        node = path[-1] or IndexNode()
+        node = IndexNode(children=node.children, entries=node.entries + ((self.__seq, entry),))
+        for pos in range(len(keys) - 1, -1, -1):
+            parent = path[pos]
+            if parent:
+                node = IndexNode(update_mapping(parent.children, {keys[pos]: node}), parent.entries)
+            else:
+                node = IndexNode({keys[pos]: node})
+        key_counts = update_mapping(mapping=self.__keys, items={key: self.__keys.get(key, 0) + 1 for key in keys})
+        return IdentifierIndex(root=node, keys=key_counts, seq=self.__seq + 1)
+
+    def remove(self, keys: typing.Iterable[str], entry: typing.Any) -> "IdentifierIndex":
+        keys = sorted(keys)
+        path = [self.__root]
+        for key in keys:
+            path.append(path[-1].children.get(key))
+        node = IndexNode(children=path[-1].children, entries=tuple(item for item in path[-1].entries if item[1] is not entry))
+        for pos in range(len(keys) - 1, -1, -1):
+            parent = path[pos]
+            node = IndexNode(update_mapping(parent.children, {keys[pos]: node if node.children or node.entries else None}), parent.entries)
+        key_counts = update_mapping(mapping=self.__keys, items={key: self.__keys.get(key) - 1 or None for key in keys})
+        return IdentifierIndex(root=node, keys=key_counts, seq=self.__seq)
+
+    def lookup(self, msg: typing.Dict) -> typing.Any:
+        """
+        Get the entry of the largest key set contained in a message. Entries of key sets with equal size are resolved in
+        favour of the one added first.
+        :param msg: Dictionary containing message data.
+        :return: Stored entry or None.
+        """
+        return self.lookup_keys(keys=msg.keys())
+
+    def lookup_keys(self, keys: typing.Iterable[str]) -> typing.Any:
+        """
+        Get the entry of the largest key set contained in the provided keys.
+        :param keys: Iterable of message keys.
+        :return: Stored entry or None.
+        """
+        keys = sorted(key for key in keys if self.__keys.get(key) is not None)
+        size = len(keys)
+        entry = None
+        entry_size = 0
+        entry_seq = None
+        stack = [(self.__root, 0, 0)]
+        while stack:
+            node, depth, start = stack.pop()
+            if node.entries:
+                seq, node_entry = node.entries[0]
+                if entry is None or depth > entry_size or (depth == entry_size and seq < entry_seq):
+                    entry, entry_size, entry_seq = node_entry, depth, seq
+            if depth + size - start < entry_size or not node.children:
+                continue
+            children = node.children
+            for pos in range(start, size):
+                child = children.get(keys[pos])
+                if child is not None:
+                    stack.append((child, depth + 1, pos + 1))
+        return entry
+
+
+class KeyShapeCache:
+    """
+    Bounded LRU cache of identifier index lookups keyed by the key shape of messages. A cache is bound to one index,
+    renewing the cache for a new index discards all cached entries but keeps the counters.
+    """
+    __slots__ = ("index", "maxsize", "lookup_keys", "__hits", "__misses")
+
+    def __init__(self, index: IdentifierIndex, maxsize: int, hits: int = 0, misses: int = 0):
+        self.index = index
+        self.maxsize = maxsize
+        self.lookup_keys = functools.lru_cache(maxsize=maxsize)(index.lookup_keys)
+        self.__hits = hits
+        self.__misses = misses
+
+    def lookup(self, msg: typing.Dict) -> typing.Any:
+        """
+        Get the entry of the largest key set contained in a message. Messages with equal keys in equal order share
+        a cache entry.
+        :param msg: Dictionary containing message data.
+        :return: Stored entry or None.
+        """
+        return self.lookup_keys(tuple(msg.keys()))
+
+    def renew(self, index: IdentifierIndex) -> "KeyShapeCache":
+        """
+        Create an empty cache for a new index.
+        :param index: IdentifierIndex object.
+        :return: KeyShapeCache object.
+        """
+        info = self.info()
+        return KeyShapeCache(index=index, maxsize=self.maxsize, hits=info["hits"], misses=info["misses"])
+
+    def info(self) -> typing.Dict[str, int]:
+        """
+        Get cache counters.
+        :return: Dictionary containing hits, misses, size and maxsize.
+        """
+        info = self.lookup_keys.cache_info()
+        return {
+            "hits": self.__hits + info.hits,
+            "misses": self.__misses + info.misses,
+            "size": info.currsize,
+            "maxsize": self.maxsize
+        }
+
+
+class ValuePredicate:
+    """
+    Identifier value that matches multiple message values. Predicates are compared and hashed by type and spec.
+    """
+    __slots__ = ()
+
+    @property
+    def spec(self) -> typing.Tuple:
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.spec == other.spec
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.spec))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}{self.spec}"
+
+
+class ValueSet(ValuePredicate):
+    __slots__ = ("values",)
+
+    def __init__(self, values: typing.FrozenSet):
+        self.values = values
+
+    @property
+    def spec(self) -> typing.Tuple:
+        return self.values,
+
+
+class ValueRange(ValuePredicate):
+    """
+    Numeric range including min and excluding max, a bound of None is unbounded.
+    """
+    __slots__ = ("min", "max")
+
+    def __init__(self, min: typing.Optional[typing.Union[int, float]] = None, max: typing.Optional[typing.Union[int, float]] = None):
+        self.min = min
+        self.max = max
+
+    @property
+    def spec(self) -> typing.Tuple:
+        return self.min, self.max
+
+
+class ValuePrefix(ValuePredicate):
+    __slots__ = ("prefix",)
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+
+    @property
+    def spec(self) -> typing.Tuple:
+        return self.prefix,
+
+
+class TypedValue:
+    """
+    Identifier value of a type that compares equal to values of other types, e.g. True and 1.0 compare equal to 1.
+    Typed values are only equal to typed values of the same type and value.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: typing.Union[bool, float]):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is TypedValue and type(self.value) is type(other.value) and self.value == other.value
+
+    def __hash__(self):
+        return hash((type(self.value).__name__, self.value))
+
+    def __repr__(self):
+        return f"{type(self.value).__name__}({self.value!r})"
+
+
+def tag_value(value: typing.Any) -> typing.Any:
+    """
+    Wrap bool and float values in a TypedValue, other values are returned unchanged.
+    :param value: Identifier value.
+    :return: Tagged value.
+    """
+    if type(value) is bool or type(value) is float:
+        return TypedValue(value)
+    return value
+
+
+def has_predicates(values: typing.Any) -> bool:
+    """
+    Check if normalized identifier values contain a predicate.
+    :param values: Single value or tuple of values.
+    :return: True if at least one value is a ValuePredicate.
+    """
+    if isinstance(values, tuple):
+        return any(isinstance(value, ValuePredicate) for value in values)
+    return isinstance(values, ValuePredicate)
+
+
+_no_ids = frozenset()
+
+
+class PositionIndex:
+    """
+    Matches the message value of a single identifier key against the values of all predicate keys of an identifier
+    set. Exact values and value sets are stored in a hash table, ranges are split into non-overlapping segments that
+    are located by bisection and prefixes are grouped by length, so a lookup needs one hash lookup per prefix length.
+    """
+    __slots__ = ("exact", "points", "segments", "prefixes")
+
+    def __init__(self, values: typing.Sequence[typing.Any]):
+        exact = dict()
+        ranges = list()
+        prefixes = dict()
+        for pos, value in enumerate(values):
+            if isinstance(value, ValueSet):
+                for item in value.values:
+                    exact.setdefault(item, set()).add(pos)
+            elif isinstance(value, ValueRange):
+                ranges.append((pos, value))
+            elif isinstance(value, ValuePrefix):
+                prefixes.setdefault(len(value.prefix), dict()).setdefault(value.prefix, set()).add(pos)
+            else:
+                exact.setdefault(value, set()).add(pos)
+        self.exact = {value: frozenset(positions) for value, positions in exact.items()}
+        self.points = tuple(sorted({bound for pos, value_range in ranges for bound in (value_range.min, value_range.max) if bound is not None}))
+        self.segments = None
+        if ranges:
+            segments = [set() for _ in range(len(self.points) + 1)]
+            for pos, value_range in ranges:
+                start = 0 if value_range.min is None else bisect.bisect_right(self.points, value_range.min)
+                end = len(self.points) if value_range.max is None else bisect.bisect_right(self.points, value_range.max) - 1
+                for segment in segments[start:end + 1]:
+                    segment.add(pos)
+            self.segments = tuple(frozenset(segment) for segment in segments)
+        self.prefixes = tuple((length, {prefix: frozenset(positions) for prefix, positions in items.items()}) for length, items in sorted(prefixes.items()))
+
+    def match(self, value: typing.Any) -> typing.FrozenSet[int]:
+        positions = self.exact.get(value, _no_ids)
+        if self.segments is not None:
+            number = value.value if type(value) is TypedValue else value
+            if (isinstance(number, int) and not isinstance(number, bool)) or (isinstance(number, float) and math.isfinite(number)):
+                positions = positions | self.segments[bisect.bisect_right(self.points, number)]
+        if self.prefixes and isinstance(value, str):
+            for length, items in self.prefixes:
+                if length > len(value):
+                    break
+                matched = items.get(value[:length])
+                if matched:
+                    positions = positions | matched
+        return positions
+
+
+class PredicateIndex:
+    """
+    Resolves the values of a message to the identification keys of all predicate keys of an identifier set whose
+    values all match. Every identifier key is matched by a PositionIndex and the results are intersected.
+    Keys maps predicate keys to sequence numbers and is stored in a dictionary or, for many keys, a SnapshotMap.
+    Instances are immutable, updates return a new index and the position indexes are built on the first match.
+    """
+    __slots__ = ("keys", "_keys", "_positions")
+
+    def __init__(self, keys: typing.Union[typing.Dict[typing.Tuple[int, typing.Any], int], SnapshotMap]):
+        self.keys = keys
+        self._keys = None
+        self._positions = None
+
+    def update(self, keys: typing.Dict[typing.Tuple[int, typing.Any], typing.Optional[int]]) -> typing.Optional["PredicateIndex"]:
+        """
+        Create a new index with updated keys.
+        :param keys: Dictionary containing sequence numbers by predicate key, a value of None removes the key.
+        :return: PredicateIndex object or None if the index is empty.
+        """
+        keys = update_mapping(mapping=self.keys, items=keys)
+        if not keys:
+            return None
+        return PredicateIndex(keys=keys)
+
+    def __build(self):
+        keys = tuple(key for key, _ in sorted(self.keys.items(), key=lambda item: item[1]))
+        values = [key[1] if isinstance(key[1], tuple) else (key[1],) for key in keys]
+        self._positions = tuple(PositionIndex(values=[item[pos] for item in values]) for pos in range(len(values[0])))
+        self._keys = keys
+
+    def __getstate__(self):
+        return self.keys
+
+    def __setstate__(self, state):
+        self.keys = state
+        self._keys = None
+        self._positions = None
+
+    def match(self, values: typing.Any) -> typing.Tuple[typing.Tuple[int, typing.Any], ...]:
+        """
+        Get the predicate keys matching the identifier values of a message.
+        :param values: Single value or tuple of values ordered by identifier key.
+        :return: Tuple of identification keys in the order they have been added, empty if none match.
+        """
+        if self._keys is None:
+            self.__build()
+        positions = self._positions
+        if len(positions) == 1:
+            values = (values,)
+        candidates = None
+        for position, value in zip(positions, values):
+            matched = position.match(value)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return ()
+        return tuple(self._keys[pos] for pos in sorted(candidates))
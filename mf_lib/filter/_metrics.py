@@ -0,0 +1,131 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from ._model import *
+import bisect
+import typing
+
+
+class Histogram:
+    """
+    Latency histogram with fixed bucket bounds in nanoseconds. Values above the last bound are counted in an
+    overflow bucket.
+    """
+    __slots__ = ("bounds", "buckets", "count", "sum", "max")
+    default_bounds = tuple(2 ** exp for exp in range(8, 27))
+
+    def __init__(self, bounds: typing.Optional[typing.Sequence[int]] = None):
+        self.bounds = tuple(bounds or Histogram.default_bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value: int):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> int:
+        """
+        Estimate a quantile as the upper bound of the bucket containing it.
+        :param q: Quantile between 0 and 1.
+        :return: Upper bound in nanoseconds, the maximum observed value for the overflow bucket or 0 if empty.
+        """
+        if not self.count:
+            return 0
+        rank = q * self.count
+        total = 0
+        for pos, count in enumerate(self.buckets):
+            total += count
+            if total >= rank and count:
+                return self.bounds[pos] if pos < len(self.bounds) else self.max
+        return self.max
+
+    def get_stats(self) -> typing.Dict:
+        return {
+            Stats.count: self.count,
+            Stats.sum_ns: self.sum,
+            Stats.max_ns: self.max,
+            Stats.p50_ns: self.quantile(0.5),
+            Stats.p99_ns: self.quantile(0.99),
+            Stats.buckets: [(bound, count) for bound, count in zip(self.bounds + (None,), self.buckets)]
+        }
+
+
+class Metrics:
+    """
+    Counters and latency histograms collected while applying filters. Counters are updated without locking, so
+    concurrent calls of the same handler may lose single increments.
+    """
+    def __init__(self, bounds: typing.Optional[typing.Sequence[int]] = None):
+        self.__bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.identification = Histogram(bounds=self.__bounds)
+        self.extraction = Histogram(bounds=self.__bounds)
+        self.__sources = dict()
+        self.__i_strs = dict()
+        self.__groups = dict()
+        self.__identification_errors = 0
+
+    def count_message(self, source: typing.Optional[str], i_str: typing.Optional[str], matched: bool):
+        counts = self.__sources.get(source)
+        if counts is None:
+            counts = self.__sources[source] = [0, 0, 0]
+        counts[0] += 1
+        if matched:
+            counts[1] += 1
+            self.__i_strs[i_str] = self.__i_strs.get(i_str, 0) + 1
+        else:
+            counts[2] += 1
+
+    def count_identification_error(self, source: typing.Optional[str]):
+        self.__identification_errors += 1
+        self.count_message(source=source, i_str=None, matched=False)
+
+    def count_result(self, m_hash: typing.FrozenSet, filter_ids: typing.Tuple, failed: bool, duration: int):
+        self.extraction.observe(duration)
+        key = (m_hash, filter_ids)
+        counts = self.__groups.get(key)
+        if counts is None:
+            counts = self.__groups[key] = [0, 0]
+        counts[failed] += 1
+
+    def get_stats(self) -> typing.Dict:
+        """
+        Create a snapshot of all counters and histograms. Result and error counts of filter groups are broken down
+        by filter ID and mappings hash.
+        :return: Dictionary containing stats.
+        """
+        filters = dict()
+        mappings = dict()
+        for (m_hash, filter_ids), (results, errors) in tuple(self.__groups.items()):
+            for counts in [filters.setdefault(filter_id, {Stats.results: 0, Stats.errors: 0}) for filter_id in filter_ids] + [mappings.setdefault(m_hash, {Stats.results: 0, Stats.errors: 0})]:
+                counts[Stats.results] += results
+                counts[Stats.errors] += errors
+        return {
+            Stats.sources: {source: {Stats.messages: counts[0], Stats.matches: counts[1], Stats.misses: counts[2]} for source, counts in tuple(self.__sources.items())},
+            Stats.i_strs: dict(self.__i_strs),
+            Stats.filters: filters,
+            Stats.mappings: mappings,
+            Stats.identification_errors: self.__identification_errors,
+            Stats.identification: self.identification.get_stats(),
+            Stats.extraction: self.extraction.get_stats()
+        }
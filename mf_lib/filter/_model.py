@@ -28,6 +28,13 @@ class Identifier:
     value = "value"
 
 
+class IdentifierValue:
+    one_of = "one_of"
+    min = "min"
+    max = "max"
+    prefix = "prefix"
+
+
 class Mapping:
     src_path = "src_path"
     dst_path = "dst_path"
@@ -38,9 +45,73 @@ class MappingType:
     extra = "extra"
 
 
-class FilterMetadata:
+class SinkPolicy:
+    backpressure = "backpressure"
+    drop_newest = "drop_newest"
+    drop_oldest = "drop_oldest"
+    error = "error"
+
+
+class ShardBy:
     source = "source"
-    m_hash = "m_hash"
-    i_hash = "i_hash"
-    i_str = "i_str"
-    args = "args"
\ No newline at end of file
+    identifier = "identifier"
+
+
+class State:
+    magic = b"MFLS"
+    version = 7
+    identifiers = "identifiers"
+    identifier_index = "identifier_index"
+    filters = "filters"
+    filter_groups = "filter_groups"
+    mappings = "mappings"
+    filter_entries = "filter_entries"
+    mappings_refs = "mappings_refs"
+    identifiers_refs = "identifiers_refs"
+    sources_refs = "sources_refs"
+
+
+class Stats:
+    sources = "sources"
+    i_strs = "i_strs"
+    filters = "filters"
+    mappings = "mappings"
+    messages = "messages"
+    matches = "matches"
+    misses = "misses"
+    results = "results"
+    errors = "errors"
+    identification_errors = "identification_errors"
+    identification_cache = "identification_cache"
+    identification = "identification"
+    extraction = "extraction"
+    count = "count"
+    sum_ns = "sum_ns"
+    max_ns = "max_ns"
+    p50_ns = "p50_ns"
+    p99_ns = "p99_ns"
+    buckets = "buckets"
+    pending = "pending"
+    groups = "groups"
+    batches = "batches"
+    dropped = "dropped"
+    failures = "failures"
+
+
+class Stage:
+    identification = "identification"
+    lookup = "lookup"
+    extraction = "extraction"
+    build = "build"
+
+
+class Memory:
+    filter_entries = "filter_entries"
+    filters = "filters"
+    mappings = "mappings"
+    identifiers = "identifiers"
+    identifier_index = "identifier_index"
+    refs = "refs"
+    paths = "paths"
+    filter_groups = "filter_groups"
+    total = "total"
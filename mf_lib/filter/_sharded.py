@@ -0,0 +1,220 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("ShardedFilterHandler", "ShardBy")
+
+from ._handler import *
+from ._model import *
+import mf_lib.exceptions
+import mf_lib.builders
+import multiprocessing
+import threading
+import typing
+import zlib
+import os
+
+
+def _worker(conn):
+    filter_handler = FilterHandler()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        method, kwargs = request
+        try:
+            conn.send((True, getattr(filter_handler, method)(**kwargs)))
+        except Exception as ex:
+            conn.send((False, ex))
+    conn.close()
+
+
+def _shard(key: typing.Hashable, count: int) -> int:
+    return zlib.crc32(repr(key).encode()) % count
+
+
+class ShardedFilterHandler:
+    """
+    Applies filters in worker processes. Every worker holds a replica of all filters, messages are partitioned by
+    source or identification key so that all messages of a partition are handled by the same worker.
+    """
+    def __init__(self, workers: typing.Optional[int] = None, shard_by: str = ShardBy.source, mp_context: typing.Optional[multiprocessing.context.BaseContext] = None):
+        """
+        :param workers: Number of worker processes. Default is the number of CPUs.
+        :param shard_by: Partition messages by ShardBy.source or ShardBy.identifier. Default is ShardBy.source.
+        :param mp_context: Multiprocessing context used for creating workers.
+        """
+        assert shard_by in (ShardBy.source, ShardBy.identifier), f"unknown shard_by value '{shard_by}'"
+        mp_context = mp_context or multiprocessing.get_context()
+        self.__lock = threading.Lock()
+        self.__shard_by = shard_by
+        self.__filter_handler = FilterHandler()
+        self.__connections = list()
+        self.__processes = list()
+        for _ in range(workers or os.cpu_count() or 1):
+            parent_conn, child_conn = mp_context.Pipe()
+            process = mp_context.Process(target=_worker, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self.__connections.append(parent_conn)
+            self.__processes.append(process)
+
+    def __request(self, requests: typing.Dict[int, typing.Tuple[str, typing.Dict]]) -> typing.Dict[int, typing.Any]:
+        with self.__lock:
+            for pos, request in requests.items():
+                self.__connections[pos].send(request)
+            responses = {pos: self.__connections[pos].recv() for pos in requests}
+        for ok, value in responses.values():
+            if not ok:
+                raise value
+        return {pos: value for pos, (ok, value) in responses.items()}
+
+    def __broadcast(self, method: str, **kwargs):
+        getattr(self.__filter_handler, method)(**kwargs)
+        self.__request({pos: (method, kwargs) for pos in range(len(self.__connections))})
+
+    def add_filter(self, filter: typing.Dict):
+        """
+        Add a filter to all workers.
+        :param filter: Dictionary containing filter data.
+        :return: None
+        """
+        self.__broadcast("add_filter", filter=filter)
+
+    def add_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Add multiple filters to all workers.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
+        self.__broadcast("add_filters", filters=list(filters))
+
+    def delete_filter(self, id: str):
+        """
+        Delete a filter from all workers.
+        :param id: ID of a filter to be deleted.
+        :return: None
+        """
+        self.__broadcast("delete_filter", id=id)
+
+    def delete_filters(self, ids: typing.Iterable[str]):
+        """
+        Delete multiple filters from all workers.
+        :param ids: Iterable of IDs of filters to be deleted.
+        :return: None
+        """
+        self.__broadcast("delete_filters", ids=list(ids))
+
+    def replace_filters(self, filters: typing.Iterable[typing.Dict]):
+        """
+        Replace all filters of all workers.
+        :param filters: Iterable of dictionaries containing filter data.
+        :return: None
+        """
+        self.__broadcast("replace_filters", filters=list(filters))
+
+    def get_results_batch(self, messages: typing.Sequence[typing.Dict], sources: typing.Optional[typing.Union[str, typing.Sequence[str]]] = None, data_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, extra_builder: typing.Optional[typing.Callable[[typing.Generator], typing.Any]] = mf_lib.builders.dict_builder, data_ignore_missing_keys: bool = False, extra_ignore_missing_keys: bool = False, ignore_no_filter: bool = False, include_args: bool = False) -> BatchResult:
+        """
+        Partitions messages, applies filters in the workers and merges the results. Results of each partition keep
+        the message order. Builders must be picklable.
+        :param messages: Sequence of dictionaries containing message data.
+        :param sources: Source of all messages or a sequence containing the source of each message.
+        :param data_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param extra_builder: Builder function for custom data structures. Default is mf_lib.builders.dict_builder.
+        :param data_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param extra_ignore_missing_keys: Ignore missing message keys. Default is False.
+        :param ignore_no_filter: Skip messages without filters instead of storing a NoFilterError. Default is False.
+        :param include_args: Store filter arguments by filter ID in FilterResult.args. Default is False.
+        :returns: BatchResult object with message indices referring to the messages argument.
+        """
+        single_source = sources is None or isinstance(sources, str)
+        count = len(self.__connections)
+        shards = dict()
+        batch_result = BatchResult()
+        for pos, message in enumerate(messages):
+            source = sources if single_source else sources[pos]
+            if self.__shard_by == ShardBy.identifier:
+                try:
+                    key = self.__filter_handler.identify_message(message=message, source=source)
+                except mf_lib.exceptions.MessageIdentificationError as ex:
+                    batch_result.errors[pos] = ex
+                    continue
+            else:
+                key = source
+            shard = _shard(key, count)
+            if shard not in shards:
+                shards[shard] = ([pos], [message], [source])
+            else:
+                shards[shard][0].append(pos)
+                shards[shard][1].append(message)
+                shards[shard][2].append(source)
+        kwargs = {
+            "data_builder": data_builder,
+            "extra_builder": extra_builder,
+            "data_ignore_missing_keys": data_ignore_missing_keys,
+            "extra_ignore_missing_keys": extra_ignore_missing_keys,
+            "ignore_no_filter": ignore_no_filter,
+            "include_args": include_args
+        }
+        responses = self.__request({shard: ("get_results_batch", dict(messages=item[1], sources=item[2], **kwargs)) for shard, item in shards.items()})
+        for shard, shard_result in responses.items():
+            positions = shards[shard][0]
+            for group in shard_result.groups:
+                group.indices = [positions[pos] for pos in group.indices]
+                batch_result.groups.append(group)
+            for pos, ex in shard_result.errors.items():
+                batch_result.errors[positions[pos]] = ex
+        return batch_result
+
+    def get_filter_args(self, id: str) -> typing.Dict:
+        """
+        Get filter arguments.
+        :param id: ID of a filter.
+        :return: Dictionary containing args of a filter.
+        """
+        return self.__filter_handler.get_filter_args(id=id)
+
+    def get_sources(self) -> typing.List:
+        """
+        Get all sources added by filters.
+        :return: List containing sources.
+        """
+        return self.__filter_handler.get_sources()
+
+    def close(self):
+        """
+        Stop all workers.
+        :return: None
+        """
+        with self.__lock:
+            for conn in self.__connections:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+                conn.close()
+            for process in self.__processes:
+                process.join()
+            self.__connections.clear()
+            self.__processes.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
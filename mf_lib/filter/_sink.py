@@ -0,0 +1,261 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+__all__ = ("BatchingSink", "SinkBatch", "SinkPolicy", "MemorySink")
+
+from ._handler import *
+from ._model import *
+import mf_lib.exceptions
+import collections
+import threading
+import typing
+import time
+
+
+class SinkBatch:
+    """
+    Results of a group passed to a sink callback in the order they have been put. Created is the clock time of the
+    first result.
+    """
+    __slots__ = ("key", "results", "created")
+
+    def __init__(self, key: typing.Hashable, created: float):
+        self.key = key
+        self.results = list()
+        self.created = created
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(key={self.key}, results={len(self.results)}, created={self.created})"
+
+
+class MemorySink:
+    """
+    Sink callback that keeps all batches in memory, e.g. as a stand-in for a database in tests. If fail is set to
+    an exception it is raised for every call instead of storing the batch.
+    """
+    def __init__(self):
+        self.batches = list()
+        self.fail = None
+
+    def __call__(self, batch: SinkBatch):
+        if self.fail is not None:
+            raise self.fail
+        self.batches.append(batch)
+
+    @property
+    def results(self) -> typing.List[FilterResult]:
+        return [result for batch in self.batches for result in batch.results]
+
+
+class BatchingSink:
+    """
+    Collects results per group and passes them to a callback in batches once a group reaches a size or age
+    threshold. Groups are formed by filter IDs unless a key function is provided. The number of buffered results is
+    bounded, batches are delivered one at a time in the order they have been completed.
+    """
+    def __init__(self, callback: typing.Callable[[SinkBatch], None], max_batch_size: int = 1000, max_age: typing.Optional[float] = 1.0, max_pending: int = 100000, policy: str = SinkPolicy.backpressure, key: typing.Optional[typing.Callable[[FilterResult], typing.Hashable]] = None, error_callback: typing.Optional[typing.Callable[[SinkBatch, Exception], None]] = None, interval: typing.Optional[float] = None, clock: typing.Callable[[], float] = time.monotonic):
+        """
+        :param callback: Callable that receives SinkBatch objects, e.g. for bulk writes.
+        :param max_batch_size: Number of results at which a group is flushed. Default is 1000.
+        :param max_age: Seconds after the first result at which a group is flushed. Default is 1.0, None disables age flushing.
+        :param max_pending: Maximum number of buffered results of all groups. Default is 100000.
+        :param policy: Handling of results put while max_pending results are buffered, see SinkPolicy. Default is SinkPolicy.backpressure.
+        :param key: Callable that returns the group key of a result. Default groups by FilterResult.filter_ids.
+        :param error_callback: Callable that receives a batch and the exception raised by the callback. Default is None, exceptions are raised by the call that triggered the flush.
+        :param interval: Seconds between age checks of a background thread. Default is None, ages are only checked by put and flush_due.
+        :param clock: Clock used for group ages. Default is time.monotonic.
+        """
+        assert policy in (SinkPolicy.backpressure, SinkPolicy.drop_newest, SinkPolicy.drop_oldest, SinkPolicy.error), f"unknown policy '{policy}'"
+        assert max_batch_size >= 1, "'max_batch_size' must be at least 1"
+        assert max_pending >= 1, "'max_pending' must be at least 1"
+        self.__callback = callback
+        self.__error_callback = error_callback
+        self.__max_batch_size = max_batch_size
+        self.__max_age = max_age
+        self.__max_pending = max_pending
+        self.__policy = policy
+        self.__key = key
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__delivery_lock = threading.Lock()
+        self.__groups = dict()
+        self.__ready = collections.deque()
+        self.__pending = 0
+        self.__batches = 0
+        self.__results = 0
+        self.__dropped = 0
+        self.__failures = 0
+        self.__closed = False
+        self.__stop = threading.Event()
+        self.__thread = None
+        if interval is not None:
+            self.__thread = threading.Thread(target=self.__run, args=(interval,), daemon=True)
+            self.__thread.start()
+
+    def __run(self, interval: float):
+        while not self.__stop.wait(interval):
+            self.__flush_due(raise_errors=False)
+
+    def __pop(self, key: typing.Hashable):
+        batch = self.__groups.pop(key)
+        self.__pending -= len(batch.results)
+        self.__ready.append(batch)
+
+    def __make_room(self) -> bool:
+        if self.__policy == SinkPolicy.drop_newest:
+            self.__dropped += 1
+            return False
+        if self.__policy == SinkPolicy.error:
+            raise mf_lib.exceptions.SinkFullError(max_pending=self.__max_pending)
+        key = next(iter(self.__groups))
+        if self.__policy == SinkPolicy.drop_oldest:
+            batch = self.__groups[key]
+            del batch.results[0]
+            self.__pending -= 1
+            self.__dropped += 1
+            if not batch.results:
+                del self.__groups[key]
+        else:
+            self.__pop(key)
+        return True
+
+    def __deliver(self, raise_errors: bool):
+        error = None
+        with self.__delivery_lock:
+            while True:
+                with self.__lock:
+                    if not self.__ready:
+                        break
+                    batch = self.__ready.popleft()
+                try:
+                    self.__callback(batch)
+                except Exception as ex:
+                    with self.__lock:
+                        self.__failures += 1
+                    if self.__error_callback is not None:
+                        self.__error_callback(batch, ex)
+                    elif error is None:
+                        error = ex
+                else:
+                    with self.__lock:
+                        self.__batches += 1
+                        self.__results += len(batch.results)
+        if error is not None and raise_errors:
+            raise error
+
+    def __add(self, result: FilterResult) -> bool:
+        if self.__closed:
+            raise mf_lib.exceptions.SinkClosedError()
+        if self.__pending >= self.__max_pending and not self.__make_room():
+            return False
+        key = result.filter_ids if self.__key is None else self.__key(result)
+        batch = self.__groups.get(key)
+        if batch is None:
+            batch = self.__groups[key] = SinkBatch(key=key, created=self.__clock())
+        batch.results.append(result)
+        self.__pending += 1
+        if len(batch.results) >= self.__max_batch_size or (self.__max_age is not None and self.__clock() - batch.created >= self.__max_age):
+            self.__pop(key)
+        return True
+
+    def put(self, result: FilterResult) -> bool:
+        """
+        Add a result to its group and flush the group if a threshold is reached. Results containing an exception
+        are not buffered.
+        :param result: FilterResult object.
+        :return: True if the result has been buffered, False if it has been dropped.
+        """
+        if result.ex is not None:
+            return False
+        with self.__lock:
+            added = self.__add(result)
+        if self.__ready:
+            self.__deliver(raise_errors=True)
+        return added
+
+    def put_many(self, results: typing.Iterable[FilterResult]) -> int:
+        """
+        Add multiple results, e.g. all results yielded by FilterHandler.get_results.
+        :param results: Iterable of FilterResult objects.
+        :return: Number of buffered results.
+        """
+        count = 0
+        for result in results:
+            count += self.put(result)
+        return count
+
+    def __flush_due(self, raise_errors: bool):
+        if self.__max_age is not None:
+            with self.__lock:
+                now = self.__clock()
+                for key in [key for key, batch in self.__groups.items() if now - batch.created >= self.__max_age]:
+                    self.__pop(key)
+        self.__deliver(raise_errors=raise_errors)
+
+    def flush_due(self):
+        """
+        Flush all groups that reached max_age.
+        :return: None
+        """
+        self.__flush_due(raise_errors=True)
+
+    def flush(self):
+        """
+        Flush all groups.
+        :return: None
+        """
+        with self.__lock:
+            for key in list(self.__groups):
+                self.__pop(key)
+        self.__deliver(raise_errors=True)
+
+    def close(self):
+        """
+        Stop the background thread and flush all groups. Putting results afterwards raises SinkClosedError.
+        :return: None
+        """
+        with self.__lock:
+            self.__closed = True
+        if self.__thread is not None:
+            self.__stop.set()
+            self.__thread.join()
+            self.__thread = None
+        self.flush()
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        """
+        Get the number of buffered results and groups, delivered batches and results, dropped results and failed
+        callback calls.
+        :return: Dictionary containing counts.
+        """
+        with self.__lock:
+            return {
+                Stats.pending: self.__pending,
+                Stats.groups: len(self.__groups),
+                Stats.batches: self.__batches,
+                Stats.results: self.__results,
+                Stats.dropped: self.__dropped,
+                Stats.failures: self.__failures
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,216 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+from ._index import *
+from ._decode import *
+import typing
+
+
+class PathSet:
+    """
+    Set of paths and getters stored in SnapshotMaps, updates only copy touched buckets. The path tree and getters
+    are built lazily on first use. Getters contains (source path, getter) tuples of all referenced source paths and
+    identifier keys for flattening messages.
+    """
+    __slots__ = ("path_map", "getter_map", "_paths", "_getters", "_tree")
+
+    def __init__(self, path_map: typing.Optional[SnapshotMap] = None, getter_map: typing.Optional[SnapshotMap] = None):
+        self.path_map = SnapshotMap() if path_map is None else path_map
+        self.getter_map = SnapshotMap() if getter_map is None else getter_map
+        self._paths = None
+        self._getters = None
+        self._tree = None
+
+    def update(self, paths: typing.Dict[typing.Tuple[str, ...], typing.Optional[bool]], getters: typing.Dict[str, typing.Optional[typing.Callable]]) -> "PathSet":
+        """
+        Create a new path set with updated paths and getters.
+        :param paths: Dictionary containing paths as key tuples, a value of None removes the corresponding path.
+        :param getters: Dictionary containing getters by source path, a value of None removes the corresponding getter.
+        :return: PathSet object.
+        """
+        return PathSet(
+            path_map=self.path_map.update(paths) if paths else self.path_map,
+            getter_map=self.getter_map.update(getters) if getters else self.getter_map
+        )
+
+    def flatten(self, obj: typing.Dict) -> typing.Dict[str, typing.Any]:
+        """
+        Create a flat dictionary containing the values of all referenced source paths and identifier keys present
+        in a message.
+        :param obj: Dictionary containing message data.
+        :return: Dictionary containing values by source path.
+        """
+        flat = dict()
+        for src_path, getter in self.getters:
+            try:
+                flat[src_path] = getter(obj)
+            except (LookupError, TypeError, AttributeError):
+                pass
+        return flat
+
+    @property
+    def getters(self) -> typing.Tuple[typing.Tuple[str, typing.Callable], ...]:
+        if self._getters is None:
+            self._getters = tuple(self.getter_map.items())
+        return self._getters
+
+    @property
+    def paths(self) -> typing.FrozenSet[typing.Tuple[str, ...]]:
+        if self._paths is None:
+            self._paths = frozenset(path for path, _ in self.path_map.items())
+        return self._paths
+
+    @property
+    def tree(self) -> PathNode:
+        if self._tree is None:
+            self._tree = build_path_tree(self.paths)
+        return self._tree
+
+
+class FilterGroup:
+    """
+    Filters of an identification key that share mappings. Members maps filter IDs to filter entries and is stored in
+    a dictionary or, for large groups, a SnapshotMap. Filter IDs and filter arguments by filter ID are built on first
+    use, updates return a new group.
+    """
+    __slots__ = ("m_hash", "mappings", "members", "_filter_ids", "_args")
+
+    def __init__(self, m_hash: typing.FrozenSet, mappings: typing.Dict, members: typing.Union[typing.Dict, SnapshotMap]):
+        self.m_hash = m_hash
+        self.mappings = mappings
+        self.members = members
+        self._filter_ids = None
+        self._args = None
+
+    def update(self, members: typing.Dict[str, typing.Any]) -> typing.Optional["FilterGroup"]:
+        """
+        Create a new group with updated members.
+        :param members: Dictionary containing filter entries by filter ID, a value of None removes the filter.
+        :return: FilterGroup object or None if the group is empty.
+        """
+        members = update_mapping(mapping=self.members, items=members)
+        if not members:
+            return None
+        return FilterGroup(m_hash=self.m_hash, mappings=self.mappings, members=members)
+
+    @property
+    def filter_ids(self) -> typing.Tuple[str, ...]:
+        if self._filter_ids is None:
+            self._filter_ids = tuple(filter_id for filter_id, _ in self.members.items())
+        return self._filter_ids
+
+    @property
+    def args(self) -> typing.Dict[str, typing.Any]:
+        if self._args is None:
+            self._args = {filter_id: entry.args for filter_id, entry in self.members.items()}
+        return self._args
+
+    def __getstate__(self):
+        return self.m_hash, self.mappings, self.members
+
+    def __setstate__(self, state):
+        self.m_hash, self.mappings, self.members = state
+        self._filter_ids = None
+        self._args = None
+
+
+class GroupSet:
+    """
+    Filter groups of an identification key by mappings hash, stored in a dictionary or, for many groups, a
+    SnapshotMap. The tuple of groups is built on first use, updates return a new set.
+    """
+    __slots__ = ("groups", "_values")
+
+    def __init__(self, groups: typing.Optional[typing.Union[typing.Dict, SnapshotMap]] = None):
+        self.groups = dict() if groups is None else groups
+        self._values = None
+
+    def update(self, groups: typing.Dict[typing.FrozenSet, typing.Optional[FilterGroup]]) -> typing.Optional["GroupSet"]:
+        """
+        Create a new set with updated groups.
+        :param groups: Dictionary containing groups by mappings hash, a value of None removes the group.
+        :return: GroupSet object or None if the set is empty.
+        """
+        groups = update_mapping(mapping=self.groups, items=groups)
+        if not groups:
+            return None
+        return GroupSet(groups=groups)
+
+    @property
+    def values(self) -> typing.Tuple[FilterGroup, ...]:
+        if self._values is None:
+            self._values = tuple(group for _, group in self.groups.items())
+        return self._values
+
+    def __getstate__(self):
+        return self.groups
+
+    def __setstate__(self, state):
+        self.groups = state
+        self._values = None
+
+
+class MatchKey(tuple):
+    """
+    Identification key of a message handled by the filters of several identification keys, e.g. an exact value and
+    value predicates.
+    """
+    __slots__ = ()
+
+
+class RoutingSnapshot:
+    """
+    Immutable view of the identifier index and filter groups used for applying filters to messages.
+    Filter groups are stored by identification string as GroupSet objects, so a filter update only replaces the
+    groups it touches.
+    Paths contains all message paths referenced by identifiers and mappings. Identifiers is the identifier index or a
+    key shape cache bound to it. Predicates contains a PredicateIndex by identifier set ID for sets with predicate
+    values. Filter groups of MatchKey objects are merged by mappings hash and cached.
+    """
+    __slots__ = ("identifiers", "filters", "paths", "predicates", "merged")
+    merged_size = 1024
+
+    def __init__(self, identifiers: typing.Union[IdentifierIndex, KeyShapeCache], filters: SnapshotMap, paths: PathSet, predicates: typing.Optional[typing.Union[typing.Dict[int, PredicateIndex], SnapshotMap]] = None):
+        self.identifiers = identifiers
+        self.filters = filters
+        self.paths = paths
+        self.predicates = dict() if predicates is None else predicates
+        self.merged = dict()
+
+    def get_groups(self, i_str: typing.Hashable) -> typing.Optional[typing.Tuple[FilterGroup, ...]]:
+        """
+        Get the filter groups of an identification key.
+        :param i_str: Identification key.
+        :return: Tuple of FilterGroup objects or None.
+        """
+        if type(i_str) is not MatchKey:
+            group_set = self.filters.get(i_str)
+            return group_set.values if group_set is not None else None
+        groups = self.merged.get(i_str)
+        if groups is None:
+            merged = dict()
+            for key in i_str:
+                group_set = self.filters.get(key)
+                for group in group_set.values if group_set is not None else ():
+                    if group.m_hash in merged:
+                        merged[group.m_hash][1].update(group.members.items())
+                    else:
+                        merged[group.m_hash] = (group.mappings, dict(group.members.items()))
+            groups = tuple(FilterGroup(m_hash=m_hash, mappings=mappings, members=members) for m_hash, (mappings, members) in merged.items()) or None
+            if len(self.merged) >= RoutingSnapshot.merged_size:
+                self.merged.clear()
+            self.merged[i_str] = groups
+        return groups
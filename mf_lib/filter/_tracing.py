@@ -0,0 +1,67 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import typing
+
+
+class Span:
+    """
+    Timing of a single stage of applying filters to a message. Spans of the same message share a sequence number.
+    Start times are taken from time.perf_counter_ns. Mappings hash, filter IDs and mapping type are None for the
+    identification and lookup stages.
+    """
+    __slots__ = ("seq", "stage", "start_ns", "duration_ns", "source", "i_str", "m_hash", "filter_ids", "m_type")
+
+    def __init__(self, seq: int, stage: str, start_ns: int, duration_ns: int, source: typing.Optional[str], i_str: typing.Optional[str], m_hash: typing.Optional[typing.FrozenSet] = None, filter_ids: typing.Optional[typing.Tuple] = None, m_type: typing.Optional[str] = None):
+        self.seq = seq
+        self.stage = stage
+        self.start_ns = start_ns
+        self.duration_ns = duration_ns
+        self.source = source
+        self.i_str = i_str
+        self.m_hash = m_hash
+        self.filter_ids = filter_ids
+        self.m_type = m_type
+
+    def __iter__(self):
+        for key in self.__slots__:
+            yield key, getattr(self, key)
+
+    def __repr__(self):
+        args = ", ".join(tuple(f"{key}={val}" for key, val in self))
+        return f"{self.__class__.__name__}({args})"
+
+
+class Tracing:
+    """
+    Installed trace hook with its sampling state. Every sample_rate-th message is traced.
+    """
+    __slots__ = ("hook", "sample_rate", "count")
+
+    def __init__(self, hook: typing.Callable[[Span], None], sample_rate: int):
+        assert sample_rate >= 1, "'sample_rate' must be at least 1"
+        self.hook = hook
+        self.sample_rate = sample_rate
+        self.count = 0
+
+    def sample(self) -> typing.Optional[int]:
+        """
+        Count a message and decide whether it is traced.
+        :return: Sequence number of the message or None if the message is not traced.
+        """
+        self.count += 1
+        if not self.count % self.sample_rate:
+            return self.count
@@ -15,9 +15,16 @@
 """
 
 from ._model import *
+from ._index import *
 import mf_lib.exceptions
 import typing
-import hashlib
+import operator
+import functools
+import pickle
+import mmap
+import sys
+import gc
+import re
 
 
 class HashMappingsError(mf_lib.exceptions.FilterHandlerError):
@@ -40,18 +47,254 @@ class DuplicateFilterIDError(mf_lib.exceptions.FilterHandlerError):
         super().__init__(msg=f"filter ID already exists: id={id}")
 
 
+class StateVersionError(mf_lib.exceptions.FilterHandlerError):
+    def __init__(self, version):
+        super().__init__(msg=f"unsupported state version: version={version} supported={State.version}")
+
+
+class StateFormatError(mf_lib.exceptions.FilterHandlerError):
+    def __init__(self):
+        super().__init__(msg="unknown state format")
+
+
 def validate(obj, cls, name):
     assert obj, f"'{name}' can't be None"
     assert isinstance(obj, cls), f"'{name}' can't be of type '{type(obj).__name__}'"
 
 
-def hash_mappings(mappings: typing.Dict):
+def hash_mappings(mappings: typing.Dict) -> typing.FrozenSet:
     try:
-        return hash_dict(mappings)
+        m_hash = frozenset(mappings.items())
+        hash(m_hash)
+        return m_hash
     except Exception as ex:
         raise HashMappingsError(ex, mappings)
 
 
+_segment = re.compile(r"((?:[^.\[\]\\]|\\.)*)((?:\[(?:\*|-?\d+)])*)(\.|\Z)")
+_brackets = re.compile(r"\[(\*|-?\d+)]")
+_digits = re.compile(r"-?\d+")
+_escape = re.compile(r"\\(.)")
+
+
+class PathStep:
+    key = 0
+    index = 1
+    key_or_index = 2
+    wildcard = 3
+
+
+def parse_path(src_path: str) -> typing.Tuple[typing.Tuple[int, typing.Any], ...]:
+    """
+    Split a source path into steps. Segments are separated by dots, "[n]" selects a list item, "[*]" or a "*"
+    segment selects all items of a list or all values of a dictionary and segments consisting of digits select a
+    list item or a dictionary key depending on the type of the object. A backslash escapes the following character,
+    segments containing escapes always select a dictionary key, e.g. "meta\\[x]" or "\\*".
+    :param src_path: Source path.
+    :return: Tuple of (PathStep, argument) tuples.
+    """
+    steps = list()
+    pos = 0
+    while True:
+        match = _segment.match(src_path, pos)
+        if not match:
+            raise ValueError(f"invalid path segment at position {pos}: '{src_path}'")
+        key, brackets, separator = match.groups()
+        if "\\" in key:
+            steps.append((PathStep.key, sys.intern(_escape.sub(r"\1", key))))
+        elif key == "*":
+            steps.append((PathStep.wildcard, None))
+        elif _digits.fullmatch(key):
+            steps.append((PathStep.key_or_index, (sys.intern(key), int(key))))
+        elif key or not brackets:
+            steps.append((PathStep.key, sys.intern(key)))
+        for item in _brackets.findall(brackets):
+            steps.append((PathStep.wildcard, None) if item == "*" else (PathStep.index, int(item)))
+        if not separator:
+            break
+        pos = match.end()
+    if steps[0][0] not in (PathStep.key, PathStep.key_or_index):
+        raise ValueError(f"path must start with a key: '{src_path}'")
+    return tuple(steps)
+
+
+def get_steps_value(steps: typing.Tuple[typing.Tuple[int, typing.Any], ...], obj: typing.Any) -> typing.Any:
+    for kind, key in steps:
+        if kind == PathStep.key_or_index:
+            obj = obj[key[1]] if isinstance(obj, list) else obj[key[0]]
+        else:
+            obj = obj[key]
+    return obj
+
+
+def get_wildcard_value(head: typing.Optional[typing.Callable], tail: typing.Optional[typing.Callable], obj: typing.Any) -> typing.List:
+    if head is not None:
+        obj = head(obj)
+    items = obj if isinstance(obj, list) else obj.values()
+    if tail is None:
+        return list(items)
+    return [tail(item) for item in items]
+
+
+def compile_steps(steps: typing.Tuple[typing.Tuple[int, typing.Any], ...]) -> typing.Optional[typing.Callable[[typing.Any], typing.Any]]:
+    """
+    Create a getter for path steps. Plain key paths use itemgetter or get_value, wildcards create a list containing
+    the result of the remaining steps for every item.
+    :param steps: Steps created by parse_path.
+    :return: Callable or None if there are no steps.
+    """
+    if not steps:
+        return None
+    for pos, (kind, key) in enumerate(steps):
+        if kind == PathStep.wildcard:
+            return functools.partial(get_wildcard_value, compile_steps(steps[:pos]), compile_steps(steps[pos + 1:]))
+    if len(steps) == 1 and steps[0][0] != PathStep.key_or_index:
+        return operator.itemgetter(steps[0][1])
+    if all(kind == PathStep.key for kind, key in steps):
+        return functools.partial(get_value, tuple(key for kind, key in steps))
+    return functools.partial(get_steps_value, steps)
+
+
+class MappingAccessor:
+    """
+    Mapping with a compiled source path and a getter that resolves the path. The path contains the leading keys of
+    the source path up to the first list index or wildcard.
+    """
+    __slots__ = ("src_path", "dst_path", "path", "get", "get_flat")
+
+    def __init__(self, src_path: str, dst_path: str):
+        self.src_path = sys.intern(src_path)
+        self.dst_path = sys.intern(dst_path)
+        steps = parse_path(src_path)
+        path = list()
+        for kind, key in steps:
+            if kind == PathStep.key:
+                path.append(key)
+            elif kind == PathStep.key_or_index:
+                path.append(key[0])
+            else:
+                break
+        self.path = tuple(path)
+        self.get = compile_steps(steps)
+        self.get_flat = operator.itemgetter(self.src_path)
+
+    def __repr__(self):
+        return str({Mapping.src_path: self.src_path, Mapping.dst_path: self.dst_path})
+
+
+def get_no_values(msg: typing.Dict) -> typing.Tuple:
+    return ()
+
+
+def get_single_value(get: typing.Callable, msg: typing.Dict) -> typing.Tuple:
+    return get(msg),
+
+
+def get_values(getters: typing.Tuple[typing.Callable, ...], msg: typing.Dict) -> typing.List:
+    return [get(msg) for get in getters]
+
+
+def compile_getters(getters: typing.Sequence[typing.Callable], keys: typing.Optional[typing.Sequence[str]] = None) -> typing.Callable[[typing.Dict], typing.Sequence]:
+    """
+    Combine getters into one callable that returns the values of all getters. Keys of plain itemgetters are passed
+    to a single itemgetter.
+    :param getters: Sequence of getters.
+    :param keys: Keys of all getters if every getter is an itemgetter of one key.
+    :return: Callable returning a sequence of values.
+    """
+    if not getters:
+        return get_no_values
+    if len(getters) == 1:
+        return functools.partial(get_single_value, getters[0])
+    if keys is not None:
+        return operator.itemgetter(*keys)
+    return functools.partial(get_values, tuple(getters))
+
+
+_missing = object()
+
+
+class CompiledMappings(tuple):
+    """
+    Mapping accessors of one mapping type with the destination keys and getters that extract all values at once.
+    Builders providing a compile function receive the keys once and a sequence of values per message, other builders
+    receive a mapper. Compiled builders are cached by builder and are not stored when pickled.
+    """
+    def __new__(cls, accessors: typing.Iterable[MappingAccessor] = ()):
+        return super().__new__(cls, accessors)
+
+    def __init__(self, accessors: typing.Iterable[MappingAccessor] = ()):
+        super().__init__()
+        self.keys = tuple(accessor.dst_path for accessor in self)
+        plain = all(isinstance(accessor.get, operator.itemgetter) for accessor in self)
+        self.get = compile_getters([accessor.get for accessor in self], keys=[accessor.path[0] for accessor in self] if plain else None)
+        self.get_flat = compile_getters([accessor.get_flat for accessor in self], keys=[accessor.src_path for accessor in self])
+        self.builders = dict()
+
+    def __reduce__(self):
+        return CompiledMappings, (tuple(self),)
+
+    def compile(self, builder: typing.Callable[[typing.Generator], typing.Any], keys: typing.Optional[typing.Tuple[str, ...]] = None) -> typing.Optional[typing.Callable[[typing.Sequence], typing.Any]]:
+        """
+        Get the compiled builder for the destination keys of all mappings or a subset of keys.
+        :param builder: Builder function, optionally providing a compile function.
+        :param keys: Subset of destination keys, default is all keys.
+        :return: Compiled builder or None if the builder does not provide a compile function.
+        """
+        cache_key = builder if keys is None else (builder, keys)
+        compiled = self.builders.get(cache_key, _missing)
+        if compiled is _missing:
+            compile_builder = getattr(builder, "compile", None)
+            compiled = self.builders[cache_key] = None if compile_builder is None else compile_builder(self.keys if keys is None else keys)
+        return compiled
+
+    def build(self, builder: typing.Callable[[typing.Generator], typing.Any], msg: typing.Dict, ignore_missing: bool, map_msg: typing.Callable[..., typing.Generator]) -> typing.Any:
+        """
+        Extract values and build a result. Values are extracted by a single getter call, if it fails the mappings are
+        resolved one by one to handle missing keys and to report the failing mapping.
+        :param builder: Builder function, optionally providing a compile function.
+        :param msg: Dictionary containing message data.
+        :param ignore_missing: Ignore missing message keys.
+        :param map_msg: mapper or flat_mapper.
+        :return: Built result.
+        """
+        compiled = self.builders.get(builder, _missing)
+        if compiled is _missing:
+            compiled = self.compile(builder)
+        if compiled is None:
+            return builder(map_msg(mappings=self, msg=msg, ignore_missing=ignore_missing))
+        try:
+            values = self.get_flat(msg) if map_msg is flat_mapper else self.get(msg)
+        except Exception:
+            items = tuple(map_msg(mappings=self, msg=msg, ignore_missing=ignore_missing))
+            if len(items) == len(self.keys):
+                return compiled([value for key, value in items])
+            return self.compile(builder, tuple(key for key, value in items))([value for key, value in items])
+        return compiled(values)
+
+
+class FilterEntry:
+    """
+    Compiled filter with shared mappings hash and identifier hash. The identification key is the source for filters
+    without identifiers, otherwise it is set when the identifier is added and combines the identifier set ID with the
+    identifier values.
+    """
+    __slots__ = ("source", "m_hash", "i_hash", "i_values", "i_str", "args")
+
+    def __init__(self, source: str, m_hash: typing.FrozenSet, i_hash: typing.Optional[typing.Tuple], i_values: typing.Any = None, i_str: typing.Optional[typing.Hashable] = None, args: typing.Optional[typing.Dict] = None):
+        self.source = source
+        self.m_hash = m_hash
+        self.i_hash = i_hash
+        self.i_values = i_values
+        self.i_str = i_str
+        self.args = args
+
+    def __eq__(self, other):
+        if not isinstance(other, FilterEntry):
+            return NotImplemented
+        return self.source == other.source and self.m_hash == other.m_hash and self.i_hash == other.i_hash and self.i_values == other.i_values and self.args == other.args
+
+
 def parse_mappings(mappings: typing.Dict) -> typing.Dict:
     try:
         parsed_mappings = {
@@ -64,29 +307,35 @@ def parse_mappings(mappings: typing.Dict) -> typing.Dict:
             validate(dst_path, str, "destination path")
             validate(m_type, str, "mapping type")
             assert m_type in MappingType.__dict__.values()
-            parsed_mappings[m_type].append(
-                {
-                    Mapping.src_path: value,
-                    Mapping.dst_path: dst_path
-                }
-            )
-        return parsed_mappings
+            parsed_mappings[m_type].append(MappingAccessor(src_path=value, dst_path=dst_path))
+        return {m_type: CompiledMappings(accessors) for m_type, accessors in parsed_mappings.items()}
     except Exception as ex:
         raise ParseMappingsError(ex, mappings)
 
 
-def get_value(path: typing.List, obj: typing.Dict, size: int, pos: typing.Optional[int] = 0) -> typing.Any:
-    if pos < size:
-        return get_value(path, obj[path[pos]], size, pos + 1)
-    return obj[path[pos]]
+def get_value(path: typing.Tuple, obj: typing.Dict) -> typing.Any:
+    for key in path:
+        obj = obj[key]
+    return obj
 
 
-def mapper(mappings: typing.List, msg: typing.Dict, ignore_missing=False) -> typing.Generator:
+def mapper(mappings: typing.Sequence[MappingAccessor], msg: typing.Dict, ignore_missing=False) -> typing.Generator:
     for mapping in mappings:
         try:
-            src_path = mapping[Mapping.src_path].split(".")
             try:
-                yield mapping[Mapping.dst_path], get_value(src_path, msg, len(src_path) - 1)
+                yield mapping.dst_path, mapping.get(msg)
+            except LookupError:
+                if not ignore_missing:
+                    raise
+        except Exception as ex:
+            raise mf_lib.exceptions.MappingError(ex, mapping)
+
+
+def flat_mapper(mappings: typing.Sequence[MappingAccessor], msg: typing.Dict, ignore_missing=False) -> typing.Generator:
+    for mapping in mappings:
+        try:
+            try:
+                yield mapping.dst_path, mapping.get_flat(msg)
             except KeyError:
                 if not ignore_missing:
                     raise
@@ -94,22 +343,156 @@ def mapper(mappings: typing.List, msg: typing.Dict, ignore_missing=False) -> typ
             raise mf_lib.exceptions.MappingError(ex, mapping)
 
 
-def validate_identifier(key: str, value: typing.Optional[typing.Union[str, int, float]] = None):
+def validate_number(obj, name):
+    assert isinstance(obj, (int, float)) and not isinstance(obj, bool), f"'{name}' can't be of type '{type(obj).__name__}'"
+
+
+def validate_value(obj, name):
+    assert isinstance(obj, (str, int, float)), f"'{name}' can't be of type '{type(obj).__name__}'"
+
+
+def parse_value_predicate(value: typing.Dict) -> typing.Union[str, int, float, ValuePredicate]:
+    fields = (IdentifierValue.one_of, IdentifierValue.min, IdentifierValue.max, IdentifierValue.prefix)
+    assert value, f"identifier {Identifier.value} predicate can't be empty"
+    for field in value:
+        assert field in fields, f"unknown identifier {Identifier.value} field '{field}'"
+    if IdentifierValue.one_of in value or IdentifierValue.prefix in value:
+        assert len(value) == 1, f"identifier {Identifier.value} fields '{IdentifierValue.one_of}' and '{IdentifierValue.prefix}' can't be combined with other fields"
+    if IdentifierValue.one_of in value:
+        validate(value[IdentifierValue.one_of], list, f"identifier {IdentifierValue.one_of}")
+        values = set()
+        for item in value[IdentifierValue.one_of]:
+            validate_value(item, f"identifier {IdentifierValue.one_of} item")
+            values.add(sys.intern(item) if isinstance(item, str) else tag_value(item))
+        if len(values) == 1:
+            return values.pop()
+        return ValueSet(values=frozenset(values))
+    if IdentifierValue.prefix in value:
+        validate(value[IdentifierValue.prefix], str, f"identifier {IdentifierValue.prefix}")
+        return ValuePrefix(prefix=sys.intern(value[IdentifierValue.prefix]))
+    for field in (IdentifierValue.min, IdentifierValue.max):
+        if field in value:
+            validate_number(value[field], f"identifier {field}")
+    if IdentifierValue.min in value and IdentifierValue.max in value:
+        assert value[IdentifierValue.min] < value[IdentifierValue.max], f"identifier {IdentifierValue.min} must be lower than {IdentifierValue.max}"
+    return ValueRange(min=value.get(IdentifierValue.min), max=value.get(IdentifierValue.max))
+
+
+def validate_identifier(key: str, value: typing.Optional[typing.Union[str, int, float, typing.Dict]] = None):
     validate(key, str, f"identifier {Identifier.key}")
-    if value:
-        validate(value, (str, int, float), f"identifier {Identifier.value}")
+    if isinstance(value, dict):
+        value = parse_value_predicate(value=value)
+    elif value is not None:
+        validate_value(value, f"identifier {Identifier.value}")
     return key, value
 
 
-def hash_str(obj: str) -> str:
-    return hashlib.sha256(obj.encode()).hexdigest()
+def get_identifier_values(values: typing.Sequence) -> typing.Any:
+    """
+    Normalize identifier values the same way as values extracted from messages: an empty tuple for no values, the
+    value itself for a single value and a tuple otherwise.
+    :param values: Sequence of values ordered by identifier key.
+    :return: Normalized values.
+    """
+    if len(values) == 1:
+        return values[0]
+    return tuple(values)
+
+
+def get_typed_value(getter: typing.Callable[[typing.Dict], typing.Any], msg: typing.Dict) -> typing.Any:
+    return tag_value(getter(msg))
+
 
+def get_typed_values(getter: typing.Callable[[typing.Dict], typing.Tuple], msg: typing.Dict) -> typing.Tuple:
+    values = getter(msg)
+    for value in values:
+        if type(value) is bool or type(value) is float:
+            return tuple(tag_value(value) for value in values)
+    return values
 
-def hash_list(obj: typing.List) -> str:
-    return hash_str("".join(obj))
 
+def get_identifier_getter(keys: typing.Sequence[str]) -> typing.Optional[typing.Callable[[typing.Dict], typing.Any]]:
+    """
+    Create a getter that extracts identifier values from messages and tags bool and float values via tag_value.
+    :param keys: Identifier keys with values.
+    :return: Getter or None if no keys are provided.
+    """
+    if keys:
+        return functools.partial(get_typed_value if len(keys) == 1 else get_typed_values, operator.itemgetter(*keys))
 
-def hash_dict(obj: typing.Dict) -> str:
-    items = ["{}{}".format(key, value) for key, value in obj.items()]
-    items.sort()
-    return hash_list(items)
+
+def parse_identifiers(identifiers: typing.List) -> typing.Tuple[typing.Tuple[typing.Tuple[str, ...], typing.Tuple[str, ...]], typing.Any]:
+    i_val_keys = list()
+    i_no_val_keys = list()
+    i_values = dict()
+    for identifier in identifiers:
+        key, value = validate_identifier(**identifier)
+        if key in i_val_keys or key in i_no_val_keys:
+            raise IdentifierKeyError(key, identifiers)
+        if value is not None:
+            i_val_keys.append(key)
+            i_values[key] = value
+        else:
+            i_no_val_keys.append(key)
+    i_val_keys.sort()
+    i_no_val_keys.sort()
+    values = get_identifier_values([sys.intern(i_values[k]) if isinstance(i_values[k], str) else tag_value(i_values[k]) for k in i_val_keys])
+    return (tuple(sys.intern(key) for key in i_val_keys), tuple(sys.intern(key) for key in i_no_val_keys)), values
+
+
+def get_size(obj: typing.Any, seen: typing.Set[int]) -> int:
+    """
+    Get the size of an object including all referenced objects that have not been seen before. Functions, types and
+    modules are not followed.
+    :param obj: Object to be measured.
+    :param seen: IDs of objects already counted, updated in place.
+    :return: Size in bytes.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or callable(obj) and not hasattr(obj, "__slots__") and not isinstance(obj, functools.partial):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, functools.partial):
+            stack.extend(obj.args)
+        elif not isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                for key in cls.__dict__.get("__slots__", ()):
+                    if hasattr(obj, key):
+                        stack.append(getattr(obj, key))
+    return size
+
+
+def dump_state(state: typing.Dict, file: typing.BinaryIO):
+    file.write(State.magic)
+    file.write(State.version.to_bytes(2, "big"))
+    pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_state(file: typing.BinaryIO) -> typing.Dict:
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        header_size = len(State.magic) + 2
+        if buffer[:len(State.magic)] != State.magic:
+            raise StateFormatError()
+        version = int.from_bytes(buffer[len(State.magic):header_size], "big")
+        if version != State.version:
+            raise StateVersionError(version)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with memoryview(buffer) as view:
+                with view[header_size:] as payload:
+                    return pickle.loads(payload)
+        finally:
+            if gc_enabled:
+                gc.enable()
@@ -41,6 +41,9 @@ setuptools.setup(
     copyright=metadata.get('__copyright__'),
     packages=setuptools.find_packages(exclude=("tests", )),
     python_requires='>=3.8,<4',
+    extras_require={
+        'numpy': ['numpy']
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'Operating System :: Unix',
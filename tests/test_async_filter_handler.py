@@ -0,0 +1,107 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import concurrent.futures
+import asyncio
+import mf_lib
+import json
+
+with open("tests/resources/data_good.json") as file:
+    data_good: list = json.load(file)
+
+with open("tests/resources/filters_good.json") as file:
+    filters_good: list = json.load(file)
+
+
+async def message_stream(data):
+    for source in data:
+        for message in data[source]:
+            await asyncio.sleep(0)
+            yield source, message
+
+
+async def failing_stream():
+    yield "src_1", {"id_a": "a-1", "val": 1}
+    raise RuntimeError("stream failed")
+
+
+class TestAsyncFilterHandler(unittest.TestCase):
+    def _get_filter_handler(self):
+        filter_handler = mf_lib.FilterHandler()
+        for item in filters_good:
+            try:
+                if item["action"] == "delete":
+                    filter_handler.delete_filter(id=item["id"])
+                if item["action"] == "add":
+                    filter_handler.add_filter(filter=item["filter"])
+            except mf_lib.exceptions.FilterHandlerError:
+                pass
+        return filter_handler
+
+    def _get_sync_results(self, filter_handler):
+        results = list()
+        for source in data_good:
+            for message in data_good[source]:
+                try:
+                    results.append((source, message, [str(result) for result in filter_handler.get_results(message=message, source=source)]))
+                except mf_lib.exceptions.NoFilterError:
+                    results.append((source, message, []))
+        return results
+
+    def test_get_results(self):
+        filter_handler = self._get_filter_handler()
+
+        async def run(**kwargs):
+            async_handler = mf_lib.AsyncFilterHandler(filter_handler=filter_handler, **kwargs)
+            return [(source, message, [str(result) for result in results]) async for source, message, results in async_handler.get_results(messages=message_stream(data_good))]
+
+        expected = self._get_sync_results(filter_handler)
+        self.assertEqual(asyncio.run(run(queue_size=2, batch_size=3)), expected)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(asyncio.run(run(executor=executor, executor_threshold=1)), expected)
+
+    def test_filter_updates(self):
+        async def run():
+            async_handler = mf_lib.AsyncFilterHandler()
+            await async_handler.add_filter(filter={"source": "src_1", "mappings": {"val:data": "val"}, "id": "filter-1"})
+            results = list()
+            async for source, message, msg_results in async_handler.get_results(messages=message_stream({"src_1": [{"val": 1}, {"val": 2}]})):
+                results.append([result.data for result in msg_results])
+                if len(results) == 1:
+                    await async_handler.delete_filter(id="filter-1")
+            return results
+
+        self.assertEqual(asyncio.run(run()), [[{"val": 1}], []])
+
+    def test_identification_error(self):
+        async def run():
+            async_handler = mf_lib.AsyncFilterHandler()
+            await async_handler.add_filter(filter={"source": "src_1", "identifiers": [{"key": "id", "value": "a"}], "mappings": {"val:data": "val"}, "id": "filter-1"})
+            return [item async for item in async_handler.get_results(messages=message_stream({"src_1": [{"id": "a", "val": 1}, {"id": ["a"], "val": 2}, {"id": "b", "val": 3}]}))]
+
+        items = asyncio.run(run())
+        self.assertEqual([(source, message) for source, message, results in items], [("src_1", {"id": "a", "val": 1}), ("src_1", {"id": ["a"], "val": 2}), ("src_1", {"id": "b", "val": 3})])
+        self.assertEqual([result.data for result in items[0][2]], [{"val": 1}])
+        self.assertEqual(items[1][2], [])
+        self.assertEqual(items[2][2], [])
+
+    def test_stream_error(self):
+        async def run():
+            async_handler = mf_lib.AsyncFilterHandler(filter_handler=self._get_filter_handler())
+            return [result async for result in async_handler.get_results(messages=failing_stream())]
+
+        self.assertRaises(RuntimeError, asyncio.run, run())
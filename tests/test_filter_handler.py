@@ -17,6 +17,14 @@
 import unittest
 import mf_lib
 import json
+import tempfile
+import os
+import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 with open("tests/resources/sources.json") as file:
     sources: list = json.load(file)
@@ -111,3 +119,735 @@ class TestFilterHandler(unittest.TestCase):
         filter_handler = self._test_filter_ingestion(filters=filters_good)
         export_args = filter_handler.get_filter_args(id="filter-1")
         self.assertEqual(export_args["arg"], "test")
+
+    def test_identify_most_specific(self):
+        filter_handler = mf_lib.FilterHandler()
+        keys = [f"k{num}" for num in range(8)]
+        key_sets = list()
+        for num in range(1, 2 ** len(keys), 7):
+            key_set = [keys[pos] for pos in range(len(keys)) if num & (1 << pos)]
+            key_sets.append(key_set)
+            filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": key} for key in key_set], "mappings": {"val:data": "val"}, "id": str(num)})
+        for num in range(2 ** len(keys)):
+            message = {keys[pos]: None for pos in range(len(keys)) if num & (1 << pos)}
+            message["val"] = num
+            expected = None
+            for key_set in key_sets:
+                if set(key_set).issubset(message) and (not expected or len(key_set) > len(expected)):
+                    expected = key_set
+            if expected:
+                results = list(filter_handler.get_results(message=message, source="src"))
+                self.assertEqual(len(results), 1)
+                self.assertEqual(results[0].filter_ids, (str(key_sets.index(expected) * 7 + 1),))
+
+    def test_identify_unique_keys(self):
+        filter_handler = mf_lib.FilterHandler()
+        for num in range(200):
+            filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}, {"key": f"k{num}"}], "mappings": {"val:data": f"v{num}"}, "id": f"pair-{num}"})
+            filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": f"k{num}"}], "mappings": {"val:data": f"v{num}"}, "id": f"single-{num}"})
+        for num in range(0, 200, 2):
+            filter_handler.delete_filter(id=f"pair-{num}")
+        for num in range(200):
+            message = {"a": 1, f"k{num}": 2, f"v{num}": num}
+            results = list(filter_handler.get_results(message=message, source="src"))
+            self.assertEqual(results[0].filter_ids, (f"single-{num}",) if num % 2 == 0 else (f"pair-{num}",))
+            self.assertEqual(results[0].data, {"val": num})
+            self.assertEqual(filter_handler.flatten_message(message=message), message)
+        for num in range(200):
+            filter_handler.delete_filter(id=f"single-{num}")
+        self.assertRaises(mf_lib.exceptions.NoFilterError, next, filter_handler.get_results(message={"k0": 1, "v0": 0}, source="src"))
+        self.assertEqual(filter_handler.flatten_message(message={"a": 1, "k0": 1, "v0": 0, "k1": 1, "v1": 1}), {"a": 1, "k1": 1, "v1": 1})
+
+    def test_identification_cache(self):
+        filter_handler = mf_lib.FilterHandler(identification_cache_size=2)
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val"}, "id": "filter-1"})
+        message = {"a": 1, "b": 2, "val": 3}
+        for _ in range(3):
+            self.assertEqual(next(filter_handler.get_results(message=message)).filter_ids, ("filter-1",))
+        self.assertEqual(filter_handler.get_identification_cache_info(), {"hits": 2, "misses": 1, "size": 1, "maxsize": 2})
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}, {"key": "b"}], "mappings": {"val:data": "val"}, "id": "filter-2"})
+        self.assertEqual(next(filter_handler.get_results(message=message)).filter_ids, ("filter-2",))
+        self.assertEqual(filter_handler.get_identification_cache_info(), {"hits": 2, "misses": 2, "size": 1, "maxsize": 2})
+        for num in range(3):
+            filter_handler.identify_message(message={"a": 1, f"x{num}": 0})
+        self.assertEqual(filter_handler.get_identification_cache_info()["size"], 2)
+        self.assertRaises(mf_lib.exceptions.MessageIdentificationError, filter_handler.identify_message, message=["a"])
+        filter_handler = mf_lib.FilterHandler(identification_cache_size=None)
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val"}, "id": "filter-1"})
+        self.assertEqual(next(filter_handler.get_results(message=message)).filter_ids, ("filter-1",))
+        self.assertIsNone(filter_handler.get_identification_cache_info())
+
+    def test_get_results_deep_paths(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "a.b.c.d.e.f.g.h", "missing:data": "a.b.c.x", "time:extra": "t"}, "id": "filter-1"})
+        message = {"a": {"b": {"c": {"d": {"e": {"f": {"g": {"h": 1}}}}}}}, "t": 0}
+        result = next(filter_handler.get_results(message=message, source="src", data_ignore_missing_keys=True))
+        self.assertEqual(result.data, {"val": 1})
+        self.assertEqual(result.extra, {"time": 0})
+        result = next(filter_handler.get_results(message=message, source="src"))
+        self.assertIsInstance(result.ex, mf_lib.exceptions.MappingError)
+
+    def test_get_results_batch(self):
+        filter_handler = self._test_filter_ingestion(filters=filters_good)
+        messages = list()
+        msg_sources = list()
+        for source in data_good:
+            for message in data_good[source]:
+                messages.append(message)
+                msg_sources.append(source)
+        messages.append({"unknown": 1})
+        msg_sources.append("src_unknown")
+        batch_result = filter_handler.get_results_batch(messages=messages, sources=msg_sources)
+        batch_results = dict()
+        for group in batch_result:
+            for pos, result in group:
+                self.assertEqual(result.filter_ids, group.filter_ids)
+                batch_results.setdefault(pos, list()).append(str(result))
+        for pos, message in enumerate(messages):
+            try:
+                results = [str(result) for result in filter_handler.get_results(message=message, source=msg_sources[pos])]
+                self.assertEqual(batch_results[pos], results)
+            except mf_lib.exceptions.NoFilterError:
+                self.assertIsInstance(batch_result.errors[pos], mf_lib.exceptions.NoFilterError)
+        self.assertIsInstance(batch_result.errors[len(messages) - 1], mf_lib.exceptions.NoFilterError)
+
+    def test_get_columns_batch(self):
+        filter_handler = self._test_filter_ingestion(filters=filters_good)
+        messages = list()
+        msg_sources = list()
+        for source in data_good:
+            for message in data_good[source]:
+                messages.append(message)
+                msg_sources.append(source)
+        batch_result = filter_handler.get_results_batch(messages=messages, sources=msg_sources, data_ignore_missing_keys=True, extra_ignore_missing_keys=True)
+        column_result = filter_handler.get_columns_batch(messages=messages, sources=msg_sources, data_ignore_missing_keys=True, extra_ignore_missing_keys=True)
+        self.assertEqual(batch_result.errors.keys(), column_result.errors.keys())
+        for group, column_group in zip(batch_result, column_result):
+            self.assertEqual(group.filter_ids, column_group.filter_ids)
+            self.assertEqual(sorted(group.indices), sorted(column_group.indices + list(column_group.errors)))
+            rows = {pos: row for row, pos in enumerate(column_group.indices)}
+            for pos, result in group:
+                if result.ex:
+                    self.assertEqual(str(result.ex), str(column_group.errors[pos]))
+                    continue
+                row = rows[pos]
+                for buffer, data in ((column_group.data, result.data), (column_group.extra, result.extra)):
+                    for key, column in buffer.columns.items():
+                        if key in data:
+                            self.assertEqual(column[row], data[key])
+                        else:
+                            self.assertIn(row, buffer.missing[key])
+
+    def test_column_buffer(self):
+        buffer = mf_lib.builders.ColumnBuffer(keys=("a", "b", "c"))
+        buffer.append(iter((("a", 1), ("b", 1.5), ("c", "x"))))
+        buffer.append(iter((("a", 2), ("c", "y"))))
+
+        def failing():
+            yield "a", 3
+            raise mf_lib.exceptions.MappingError(KeyError("b"), None)
+
+        self.assertRaises(mf_lib.exceptions.MappingError, buffer.append, failing())
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.columns, {"a": [1, 2], "b": [1.5, None], "c": ["x", "y"]})
+        self.assertEqual(buffer.missing, {"b": [1]})
+        buffer.truncate(1)
+        self.assertEqual(buffer.columns, {"a": [1], "b": [1.5], "c": ["x"]})
+        self.assertEqual(buffer.missing, {})
+
+    @unittest.skipUnless(numpy, "requires numpy")
+    def test_column_buffer_to_arrays(self):
+        buffer = mf_lib.builders.ColumnBuffer(keys=("a", "b", "c", "d"))
+        buffer.append(iter((("a", 1), ("b", 1.5), ("c", "x"), ("d", True))))
+        buffer.append(iter((("a", 2), ("c", "y"), ("d", False))))
+        arrays, masks = buffer.to_arrays()
+        self.assertEqual(arrays["a"].dtype, numpy.int64)
+        self.assertEqual(arrays["b"].dtype, numpy.float64)
+        self.assertEqual(arrays["c"].dtype, object)
+        self.assertEqual(arrays["d"].dtype, numpy.bool_)
+        self.assertTrue(numpy.isnan(arrays["b"][1]))
+        self.assertEqual(list(masks), ["b"])
+        self.assertEqual(masks["b"].tolist(), [False, True])
+
+    def test_ignore_no_filter(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1"})
+        self.assertEqual(list(filter_handler.get_results(message={"val": 1}, source="other", ignore_no_filter=True)), [])
+        self.assertRaises(mf_lib.exceptions.NoFilterError, list, filter_handler.get_results(message={"val": 1}, source="other"))
+        batch_result = filter_handler.get_results_batch(messages=[{"val": 1}, {"val": 2}], sources=["other", "src"], ignore_no_filter=True)
+        self.assertEqual(batch_result.errors, {})
+        self.assertEqual([group.indices for group in batch_result], [[1]])
+        list(filter_handler.get_results(message={"val": 1}, ignore_no_filter=True))
+        self.assertEqual(filter_handler.get_miss_counts(), {"other": 3, None: 1})
+
+    def test_filter_result(self):
+        result = mf_lib.FilterResult(data={"val": 1}, filter_ids=("filter-1",))
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertEqual(dict(result), {"data": {"val": 1}, "extra": None, "filter_ids": ("filter-1",), "ex": None})
+        self.assertEqual(str(result), "{'data': {'val': 1}, 'extra': None, 'filter_ids': ('filter-1',), 'ex': None}")
+        self.assertEqual(repr(result), "FilterResult(data={'val': 1}, extra=None, filter_ids=('filter-1',), ex=None)")
+
+    def test_get_results_snapshot(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1"})
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"value:data": "val"}, "id": "filter-2"})
+        results = filter_handler.get_results(message={"val": 1}, source="src")
+        self.assertEqual(next(results).filter_ids, ("filter-1",))
+        filter_handler.delete_filter(id="filter-2")
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"v:data": "val"}, "id": "filter-3"})
+        self.assertEqual(next(results).filter_ids, ("filter-2",))
+        self.assertRaises(StopIteration, next, results)
+        self.assertEqual([result.filter_ids for result in filter_handler.get_results(message={"val": 1}, source="src")], [("filter-1",), ("filter-3",)])
+
+    def test_get_results_large_groups(self):
+        filter_handler = mf_lib.FilterHandler()
+        for num in range(150):
+            filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": f"shared-{num}", "args": {"num": num}})
+            filter_handler.add_filter(filter={"source": "src", "mappings": {f"v{num}:data": "val"}, "id": f"single-{num}"})
+        results = sorted(filter_handler.get_results(message={"val": 1}, source="src", include_args=True), key=lambda result: -len(result.filter_ids))
+        filter_handler.delete_filters(ids=[f"shared-{num}" for num in range(0, 150, 2)] + [f"single-{num}" for num in range(100)])
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": "shared-new"})
+        self.assertEqual(len(results), 151)
+        self.assertEqual(sorted(results[0].filter_ids), sorted(f"shared-{num}" for num in range(150)))
+        self.assertEqual(results[0].args, {f"shared-{num}": {"num": num} for num in range(150)})
+        results = sorted(filter_handler.get_results(message={"val": 1}, source="src", include_args=True), key=lambda result: -len(result.filter_ids))
+        self.assertEqual(len(results), 51)
+        self.assertEqual(sorted(results[0].filter_ids), sorted([f"shared-{num}" for num in range(1, 150, 2)] + ["shared-new"]))
+        self.assertEqual(results[0].args["shared-new"], None)
+        self.assertEqual(sorted(result.filter_ids[0] for result in results[1:]), sorted(f"single-{num}" for num in range(100, 150)))
+
+    def test_add_filters_transactional(self):
+        filter_handler = mf_lib.FilterHandler()
+        filters = dict()
+        for item in filters_good:
+            if item["action"] == "add":
+                filters[item["filter"]["id"]] = item["filter"]
+            else:
+                filters.pop(item["id"], None)
+        filters = list(filters.values())
+        filter_handler.add_filters(filters=filters)
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filters, filters=[{"source": "src_3", "mappings": {"val:data": "val"}, "id": "filter-new"}, filters[0]])
+        self.assertRaises(mf_lib.exceptions.UnknownFilterIDError, filter_handler.get_filter_args, id="filter-new")
+        self.assertNotIn("src_3", filter_handler.get_sources())
+        self.assertRaises(mf_lib.exceptions.DeleteFilterError, filter_handler.delete_filters, ids=[filters[0]["id"], "unknown"])
+        self.assertEqual(filter_handler.get_filter_args(id="filter-1"), {"arg": "test"})
+        filter_handler.delete_filters(ids=[item["id"] for item in filters])
+        self.assertEqual(filter_handler.get_sources(), [])
+        self.assertRaises(mf_lib.exceptions.NoFilterError, next, filter_handler.get_results(message={"id_a": "a-1", "val": 1}, source="src_1"))
+
+    def test_replace_filters(self):
+        filter_handler = mf_lib.FilterHandler()
+        filters = [
+            {"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1"},
+            {"source": "src", "mappings": {"val:data": "val"}, "id": "filter-2", "args": {"arg": 1}},
+            {"source": "src", "mappings": {"value:data": "val"}, "id": "filter-3"}
+        ]
+        filter_handler.add_filters(filters=filters)
+        filter_handler.replace_filters(filters=[
+            filters[0],
+            {"source": "src", "mappings": {"val:data": "val"}, "id": "filter-2", "args": {"arg": 2}},
+            {"source": "src", "mappings": {"value:data": "val"}, "id": "filter-4"}
+        ])
+        self.assertEqual(filter_handler.get_filter_args(id="filter-2"), {"arg": 2})
+        self.assertRaises(mf_lib.exceptions.UnknownFilterIDError, filter_handler.get_filter_args, id="filter-3")
+        results = {result.filter_ids: result.data for result in filter_handler.get_results(message={"val": 1}, source="src")}
+        self.assertEqual(results, {tuple(sorted(results)[0]): {"val": 1}, ("filter-4",): {"value": 1}})
+        self.assertEqual(set(sorted(results)[0]), {"filter-1", "filter-2"})
+        self.assertRaises(mf_lib.exceptions.ReplaceFiltersError, filter_handler.replace_filters, filters=[filters[0], {"source": "src", "mappings": {"val:int": "val"}, "id": "filter-5"}])
+        self.assertEqual(filter_handler.get_filter_args(id="filter-2"), {"arg": 2})
+
+    def test_save_load_state(self):
+        filter_handler = self._test_filter_ingestion(filters=filters_good)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state")
+            filter_handler.save_state(path=path)
+            loaded_handler = mf_lib.FilterHandler()
+            loaded_handler.add_filter(filter={"source": "src_3", "mappings": {"val:data": "val"}, "id": "filter-x"})
+            loaded_handler.load_state(path=path)
+            with open(path, "r+b") as file:
+                file.write(b"XXXX")
+            self.assertRaises(mf_lib.exceptions.LoadStateError, loaded_handler.load_state, path=path)
+        self.assertNotIn("src_3", loaded_handler.get_sources())
+        self.assertEqual(loaded_handler.get_filter_args(id="filter-1"), {"arg": "test"})
+        for source in data_good:
+            for message in data_good[source]:
+                try:
+                    results = [(sorted(result.filter_ids), result.data, result.extra) for result in filter_handler.get_results(message=message, source=source)]
+                except mf_lib.exceptions.NoFilterError:
+                    results = None
+                try:
+                    self.assertEqual([(sorted(result.filter_ids), result.data, result.extra) for result in loaded_handler.get_results(message=message, source=source)], results)
+                except mf_lib.exceptions.NoFilterError:
+                    self.assertIsNone(results)
+        loaded_handler.delete_filter(id="filter-1")
+        loaded_handler.add_filter(filter={"source": "src_1", "identifiers": [{"key": "id_a", "value": "a-1"}], "mappings": {"val:data": "val"}, "id": "filter-1"})
+
+    def test_get_results_from_bytes(self):
+        filter_handler = self._test_filter_ingestion(filters=filters_good)
+        for source in data_good:
+            for message in data_good[source]:
+                payload = dict(message)
+                payload["unused"] = {"values": [1.5, 2.5, {"x": "}{]["}], "text": "\"quoted\" \\ text"}
+                payload["unused_list"] = [1, 2, 3]
+                try:
+                    expected = [str(result) for result in filter_handler.get_results(message=message, source=source)]
+                except mf_lib.exceptions.NoFilterError:
+                    expected = None
+                try:
+                    results = [str(result) for result in filter_handler.get_results_from_bytes(payload=json.dumps(payload, indent=1).encode(), source=source)]
+                    self.assertEqual(results, expected)
+                except mf_lib.exceptions.NoFilterError:
+                    self.assertIsNone(expected)
+        self.assertRaises(mf_lib.exceptions.MessageDecodeError, filter_handler.get_results_from_bytes, payload=b'{"id_a": ', source="src_1")
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "ka", "deep:data": "obj.ka"}, "id": "filter-1"})
+        for payload in (b'{"ka": 5, "obj": {"ka": 1}, "ka": 6}', b'{"k\\u0061": 5, "obj": {"ka": 1, "k\\u0061": 2}, "ka": 6}'):
+            self.assertNotEqual(json.loads(payload)["ka"], 5)
+            self.assertEqual(next(filter_handler.get_results_from_bytes(payload=payload, source="src")).data, {"val": 5, "deep": 1})
+
+    def test_get_stats(self):
+        filter_handler = mf_lib.FilterHandler(metrics=True)
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val"}, "id": "filter-1"})
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val"}, "id": "filter-2"})
+        list(filter_handler.get_results(message={"a": 1, "val": 1}, source="src"))
+        list(filter_handler.get_results(message={"a": 1}, source="src"))
+        list(filter_handler.get_results(message={"b": 1}, source="src", ignore_no_filter=True))
+        self.assertRaises(mf_lib.exceptions.MessageIdentificationError, list, filter_handler.get_results(message=["a"], source="other"))
+        filter_handler.get_results_batch(messages=[{"a": 1, "val": 2}, {"b": 1}], sources="src")
+        stats = filter_handler.get_stats()
+        self.assertEqual(stats["sources"], {"src": {"messages": 5, "matches": 3, "misses": 2}, "other": {"messages": 1, "matches": 0, "misses": 1}})
+        self.assertEqual(stats["i_strs"], {(0, ()): 3})
+        self.assertEqual(stats["filters"], {"filter-1": {"results": 2, "errors": 1}, "filter-2": {"results": 2, "errors": 1}})
+        self.assertEqual(list(stats["mappings"].values()), [{"results": 2, "errors": 1}])
+        self.assertEqual(stats["identification_errors"], 1)
+        self.assertEqual(stats["identification"]["count"], 5)
+        self.assertEqual(stats["extraction"]["count"], 3)
+        self.assertEqual(sum(count for _, count in stats["extraction"]["buckets"]), 3)
+        self.assertGreaterEqual(stats["extraction"]["p99_ns"], stats["extraction"]["p50_ns"])
+        self.assertEqual(stats["identification_cache"]["misses"], 3)
+        filter_handler.get_stats(reset=True)
+        self.assertEqual(filter_handler.get_stats()["sources"], {})
+        self.assertIsNone(mf_lib.FilterHandler().get_stats())
+
+    def test_trace_hook(self):
+        filter_handler = mf_lib.FilterHandler(metrics=True)
+        filter_handler.add_filter(filter={"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val", "time:extra": "t"}, "id": "filter-1"})
+        spans = list()
+        filter_handler.set_trace_hook(hook=spans.append, sample_rate=2)
+        for num in range(4):
+            self.assertEqual(next(filter_handler.get_results(message={"a": 1, "val": num, "t": 0}, source="src")).data, {"val": num})
+        self.assertEqual([(span.seq, span.stage, span.m_type) for span in spans], [(seq, stage, m_type) for seq in (2, 4) for stage, m_type in (("identification", None), ("lookup", None), ("extraction", "data"), ("build", "data"), ("extraction", "extra"), ("build", "extra"))])
+        self.assertEqual({(span.source, span.i_str) for span in spans}, {("src", (0, ()))})
+        self.assertEqual({span.filter_ids for span in spans if span.stage == "build"}, {("filter-1",)})
+        self.assertTrue(all(span.duration_ns >= 0 for span in spans))
+        self.assertEqual(filter_handler.get_stats()["extraction"]["count"], 4)
+        spans.clear()
+        filter_handler.set_trace_hook(hook=spans.append)
+        result = next(filter_handler.get_results(message={"a": 1, "t": 0}, source="src"))
+        self.assertIsInstance(result.ex, mf_lib.exceptions.MappingError)
+        self.assertEqual([span.stage for span in spans], ["identification", "lookup", "extraction"])
+        filter_handler.set_trace_hook(hook=None)
+        list(filter_handler.get_results(message={"a": 1, "val": 1, "t": 0}, source="src"))
+        self.assertEqual(len(spans), 3)
+
+    def test_include_args(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filters(filters=[
+            {"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1", "args": {"arg": 1}},
+            {"source": "src", "mappings": {"val:data": "val"}, "id": "filter-2"}
+        ])
+        result = next(filter_handler.get_results(message={"val": 1}, source="src", include_args=True))
+        self.assertEqual(result.args, {"filter-1": {"arg": 1}, "filter-2": None})
+        self.assertIn("'args': ", str(result))
+        result = next(filter_handler.get_results(message={"val": 1}, source="src"))
+        self.assertIsNone(result.args)
+        self.assertNotIn("args", str(result))
+        filter_handler.replace_filters(filters=[{"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1", "args": {"arg": 2}}])
+        batch_result = filter_handler.get_results_batch(messages=[{"val": 1}, {}], sources="src", include_args=True)
+        self.assertEqual(batch_result.groups[0].args, {"filter-1": {"arg": 2}})
+        self.assertEqual([result.args for result in batch_result.groups[0].results], [{"filter-1": {"arg": 2}}] * 2)
+        self.assertIsInstance(batch_result.groups[0].results[1].ex, mf_lib.exceptions.MappingError)
+        self.assertEqual(filter_handler.get_columns_batch(messages=[{"val": 1}], sources="src").groups[0].args, {"filter-1": {"arg": 2}})
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"value:data": "val"}, "id": "filter-3", "args": {"arg": 3}})
+        args = {tuple(result.filter_ids): result.args for result in filter_handler.get_results(message={"val": 1}, source="src", include_args=True)}
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"value:data": "val"}, "id": "filter-4"})
+        new_args = {tuple(result.filter_ids): result.args for result in filter_handler.get_results(message={"val": 1}, source="src", include_args=True)}
+        self.assertIs(new_args[("filter-1",)], args[("filter-1",)])
+        self.assertEqual(new_args[("filter-3", "filter-4")], {"filter-3": {"arg": 3}, "filter-4": None})
+
+    def test_memory_usage(self):
+        filter_handler = mf_lib.FilterHandler()
+        usage = filter_handler.memory_usage()
+        self.assertEqual(set(usage), {"filter_entries", "filters", "mappings", "identifiers", "identifier_index", "refs", "paths", "filter_groups", "total"})
+        filter_handler.add_filters(filters=[{"source": "src", "identifiers": [{"key": "a"}], "mappings": {"val:data": "val"}, "id": f"filter-{num}"} for num in range(100)])
+        large_usage = filter_handler.memory_usage()
+        self.assertGreater(large_usage["filter_entries"], usage["filter_entries"])
+        self.assertEqual(large_usage["total"], sum(value for key, value in large_usage.items() if key != "total"))
+        filter_handler.delete_filters(ids=[f"filter-{num}" for num in range(100)])
+        self.assertEqual(filter_handler.get_sources(), [])
+        self.assertLess(filter_handler.memory_usage()["total"], large_usage["total"])
+
+    def test_identification_keys_exact(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filters(filters=[
+            {"source": "src", "identifiers": [{"key": "a", "value": "ab"}, {"key": "b", "value": "c"}], "mappings": {"val:data": "val"}, "id": "filter-1"},
+            {"source": "src", "identifiers": [{"key": "a", "value": "a"}, {"key": "b", "value": "bc"}], "mappings": {"val:data": "val"}, "id": "filter-2"},
+            {"source": "src", "identifiers": [{"key": "n", "value": 1}], "mappings": {"val:data": "val"}, "id": "filter-3"},
+            {"source": "src", "identifiers": [{"key": "n", "value": "1"}], "mappings": {"val:data": "val"}, "id": "filter-4"}
+        ])
+        self.assertEqual(next(filter_handler.get_results(message={"a": "ab", "b": "c", "val": 1})).filter_ids, ("filter-1",))
+        self.assertEqual(next(filter_handler.get_results(message={"a": "a", "b": "bc", "val": 1})).filter_ids, ("filter-2",))
+        self.assertEqual(next(filter_handler.get_results(message={"n": 1, "val": 1})).filter_ids, ("filter-3",))
+        self.assertEqual(next(filter_handler.get_results(message={"n": "1", "val": 1})).filter_ids, ("filter-4",))
+        self.assertEqual(list(filter_handler.get_results(message={"a": "abc", "b": "", "val": 1}, ignore_no_filter=True)), [])
+        self.assertIsNone(filter_handler.identify_message(message={"n": [1]}))
+        self.assertEqual(filter_handler.identify_message(message={"n": {"a": 1}}, source="src"), "src")
+        self.assertEqual(list(filter_handler.get_results(message={"n": [1], "val": 1}, source="src", ignore_no_filter=True)), [])
+        filter_handler.add_filter(filter={"source": "src-2", "mappings": {"val:data": "val"}, "id": "filter-source"})
+        self.assertEqual(next(filter_handler.get_results(message={"n": [1], "val": 1}, source="src-2")).filter_ids, ("filter-source",))
+        filter_handler.delete_filter(id="filter-source")
+        filter_handler.add_filters(filters=[
+            {"source": "src", "identifiers": [{"key": "n", "value": True}], "mappings": {"val:data": "val"}, "id": "filter-5"},
+            {"source": "src", "identifiers": [{"key": "n", "value": 1.0}], "mappings": {"val:data": "val"}, "id": "filter-6"},
+            {"source": "src", "identifiers": [{"key": "n", "value": 2}, {"key": "m", "value": True}], "mappings": {"val:data": "val"}, "id": "filter-7"},
+            {"source": "src", "identifiers": [{"key": "t", "value": {"one_of": [1, True, 2.0]}}], "mappings": {"val:data": "val"}, "id": "filter-8"},
+            {"source": "src", "identifiers": [{"key": "r", "value": {"min": 1, "max": 2}}], "mappings": {"val:data": "val"}, "id": "filter-9"}
+        ])
+        for message, filter_id in (({"n": 1}, "filter-3"), ({"n": True}, "filter-5"), ({"n": 1.0}, "filter-6"), ({"n": 2, "m": True}, "filter-7"), ({"t": 1}, "filter-8"), ({"t": True}, "filter-8"), ({"t": 2.0}, "filter-8"), ({"r": 1}, "filter-9"), ({"r": 1.5}, "filter-9")):
+            message["val"] = 1
+            self.assertEqual(next(filter_handler.get_results(message=message)).filter_ids, (filter_id,))
+        for message in ({"n": 2, "m": 1}, {"t": 1.0}, {"t": 2}, {"t": False}, {"r": True}, {"r": 2.0}):
+            message["val"] = 1
+            self.assertEqual(list(filter_handler.get_results(message=message, ignore_no_filter=True)), [])
+        self.assertNotEqual(filter_handler.identify_message(message={"n": True}), filter_handler.identify_message(message={"n": 1}))
+        filter_handler.add_filters(filters=[
+            {"source": "src", "identifiers": [{"key": "z", "value": 0}], "mappings": {"val:data": "val"}, "id": "filter-10"},
+            {"source": "src", "identifiers": [{"key": "z", "value": False}], "mappings": {"val:data": "val"}, "id": "filter-11"},
+            {"source": "src", "identifiers": [{"key": "z", "value": 0.0}], "mappings": {"val:data": "val"}, "id": "filter-12"},
+            {"source": "src", "identifiers": [{"key": "z", "value": ""}], "mappings": {"val:data": "val"}, "id": "filter-13"}
+        ])
+        for message, filter_id in (({"z": 0}, "filter-10"), ({"z": False}, "filter-11"), ({"z": 0.0}, "filter-12"), ({"z": ""}, "filter-13")):
+            message["val"] = 1
+            self.assertEqual(next(filter_handler.get_results(message=message)).filter_ids, (filter_id,))
+        for message in ({"z": 5}, {"z": True}, {"z": "0"}):
+            message["val"] = 1
+            self.assertEqual(list(filter_handler.get_results(message=message, ignore_no_filter=True)), [])
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "identifiers": [{"key": "z", "value": [0]}], "mappings": {"val:data": "val"}, "id": "invalid"})
+        self.assertEqual(filter_handler.identify_message(message={"a": "a", "b": "bc"}), filter_handler.identify_message(message={"b": "bc", "a": "a", "x": 0}))
+
+    def test_get_results_list_paths(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={
+            "source": "src",
+            "mappings": {
+                "temps:data": "values[*].temp",
+                "second:data": "values[1].temp",
+                "last:data": "values[-1].temp",
+                "first:data": "readings.0.value",
+                "keyed:data": "keyed.0",
+                "all:data": "meta.*",
+                "matrix:data": "matrix[*][0]",
+                "time:extra": "t"
+            },
+            "id": "filter-1"
+        })
+        message = {"values": [{"temp": 1}, {"temp": 2}, {"temp": 3}], "readings": [{"value": 4}], "keyed": {"0": 5}, "meta": {"a": 6, "b": 7}, "matrix": [[8, 9], [10]], "t": 0, "unused": [1, 2]}
+        expected = {"temps": [1, 2, 3], "second": 2, "last": 3, "first": 4, "keyed": 5, "all": [6, 7], "matrix": [8, 10]}
+        self.assertEqual(next(filter_handler.get_results(message=message, source="src")).data, expected)
+        self.assertEqual(next(filter_handler.get_results_from_bytes(payload=json.dumps(message).encode(), source="src")).data, expected)
+        message["readings"] = []
+        message["values"].append({"value": 0})
+        self.assertIsInstance(next(filter_handler.get_results(message=message, source="src")).ex, mf_lib.exceptions.MappingError)
+        result = next(filter_handler.get_results(message=message, source="src", data_ignore_missing_keys=True))
+        self.assertNotIn("first", result.data)
+        self.assertNotIn("temps", result.data)
+        self.assertEqual(result.data["second"], 2)
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "mappings": {"val:data": "[0].val"}, "id": "filter-2"})
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "mappings": {"val:data": "a[x]"}, "id": "filter-2"})
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "mappings": {"val:data": "*"}, "id": "filter-2"})
+        self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "mappings": {"val:data": "a\\"}, "id": "filter-2"})
+        filter_handler.add_filter(filter={"source": "escaped", "mappings": {"bracket:data": "meta\\[x\\]", "star:data": "\\*", "nested_star:data": "a.\\*", "dot:data": "a\\.b", "digits:data": "l.\\0", "backslash:data": "c\\\\d"}, "id": "filter-3"})
+        message = {"meta[x]": 1, "*": 2, "a": {"*": 3, "x": 0}, "a.b": 4, "l": {"0": 5}, "c\\d": 6}
+        self.assertEqual(next(filter_handler.get_results(message=message, source="escaped")).data, {"bracket": 1, "star": 2, "nested_star": 3, "dot": 4, "digits": 5, "backslash": 6})
+        self.assertEqual(next(filter_handler.get_results_from_bytes(payload=json.dumps(message).encode(), source="escaped")).data, {"bracket": 1, "star": 2, "nested_star": 3, "dot": 4, "digits": 5, "backslash": 6})
+
+    def test_get_results_flat(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={
+            "source": "src",
+            "mappings": {
+                "val:data": "a.b.c",
+                "temps:data": "values[*].temp",
+                "time:extra": "t"
+            },
+            "identifiers": [{"key": "device"}],
+            "id": "filter-1"
+        })
+        message = {"device": "dev-1", "a": {"b": {"c": 1, "d": 2}}, "values": [{"temp": 3}, {"temp": 4}], "t": 0, "unused": 5}
+        flat = filter_handler.flatten_message(message=message)
+        self.assertEqual(flat, {"device": "dev-1", "a.b.c": 1, "values[*].temp": [3, 4], "t": 0})
+        expected = next(filter_handler.get_results(message=message, source="src"))
+        result = next(filter_handler.get_results(message=flat, source="src", flat=True))
+        self.assertEqual((result.data, result.extra, result.filter_ids), (expected.data, expected.extra, expected.filter_ids))
+        batch_result = filter_handler.get_results_batch(messages=[flat, {"device": "dev-1", "t": 0}], sources="src", flat=True)
+        self.assertEqual(batch_result.groups[0].results[0].data, expected.data)
+        self.assertIsInstance(batch_result.groups[0].results[1].ex, mf_lib.exceptions.MappingError)
+        columns = filter_handler.get_columns_batch(messages=[flat], sources="src", flat=True)
+        self.assertEqual({key: column[0] for key, column in columns.groups[0].data.columns.items()}, expected.data)
+        self.assertEqual(filter_handler.flatten_message(message={"device": "dev-1", "a": {"b": 1}}), {"device": "dev-1"})
+        filter_handler.delete_filter(id="filter-1")
+        self.assertEqual(filter_handler.flatten_message(message=message), dict())
+
+    def test_batching_sink(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src-1", "mappings": {"val:data": "val"}, "id": "filter-1"})
+        filter_handler.add_filter(filter={"source": "src-2", "mappings": {"val:data": "val"}, "id": "filter-2"})
+        now = [0.0]
+        memory_sink = mf_lib.MemorySink()
+        sink = mf_lib.BatchingSink(callback=memory_sink, max_batch_size=3, max_age=10, clock=lambda: now[0])
+        for num in range(4):
+            sink.put_many(filter_handler.get_results(message={"val": num}, source="src-1"))
+        sink.put_many(filter_handler.get_results(message={"val": 4}, source="src-2"))
+        self.assertEqual(sink.put(mf_lib.FilterResult(ex=mf_lib.exceptions.NoFilterError())), False)
+        self.assertEqual(len(memory_sink.batches), 1)
+        self.assertEqual(memory_sink.batches[0].key, ("filter-1",))
+        self.assertEqual([result.data["val"] for result in memory_sink.results], [0, 1, 2])
+        self.assertEqual(sink.get_stats(), {"pending": 2, "groups": 2, "batches": 1, "results": 3, "dropped": 0, "failures": 0})
+        now[0] = 10
+        sink.flush_due()
+        self.assertEqual([batch.key for batch in memory_sink.batches[1:]], [("filter-1",), ("filter-2",)])
+        memory_sink.fail = RuntimeError("db down")
+        sink.put_many(filter_handler.get_results(message={"val": 5}, source="src-1"))
+        self.assertRaises(RuntimeError, sink.flush)
+        self.assertEqual(sink.get_stats()["failures"], 1)
+        memory_sink.fail = None
+        sink.put_many(filter_handler.get_results(message={"val": 6}, source="src-1"))
+        sink.close()
+        self.assertEqual(memory_sink.results[-1].data["val"], 6)
+        self.assertRaises(mf_lib.exceptions.SinkClosedError, sink.put, memory_sink.results[-1])
+        results = [mf_lib.FilterResult(data={"val": num}, filter_ids=("filter-1",) if num % 2 else ("filter-2",)) for num in range(6)]
+        for policy, expected in ((mf_lib.SinkPolicy.backpressure, [0, 1, 2, 3, 4, 5]), (mf_lib.SinkPolicy.drop_newest, [0, 1, 2]), (mf_lib.SinkPolicy.drop_oldest, [4, 3, 5])):
+            memory_sink = mf_lib.MemorySink()
+            with mf_lib.BatchingSink(callback=memory_sink, max_pending=3, policy=policy, max_age=None) as sink:
+                sink.put_many(results)
+                self.assertLessEqual(sink.get_stats()["pending"], 3)
+            self.assertEqual(sorted(result.data["val"] for result in memory_sink.results), sorted(expected))
+        with mf_lib.BatchingSink(callback=mf_lib.MemorySink(), max_pending=1, policy=mf_lib.SinkPolicy.error) as sink:
+            sink.put(results[0])
+            self.assertRaises(mf_lib.exceptions.SinkFullError, sink.put, results[1])
+        failed = list()
+        memory_sink = mf_lib.MemorySink()
+        memory_sink.fail = RuntimeError("db down")
+        with mf_lib.BatchingSink(callback=memory_sink, max_batch_size=1, key=lambda result: result.data["val"] % 3, error_callback=lambda batch, ex: failed.append(batch.key)) as sink:
+            sink.put_many(results)
+        self.assertEqual(failed, [0, 1, 2, 0, 1, 2])
+
+    def test_identifier_predicates(self):
+        filter_handler = mf_lib.FilterHandler()
+        mappings = {"val:data": "val"}
+        filter_handler.add_filters(filters=[
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": {"one_of": ["1.0", "1.1", "1.2"]}}], "id": "set"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": "1.1"}], "id": "exact"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": {"prefix": "2."}}], "id": "prefix"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": {"prefix": "2.1"}}], "id": "prefix-long"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "class", "value": {"min": 10, "max": 20}}, {"key": "type", "value": "a"}], "id": "range"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "class", "value": {"min": 15}}, {"key": "type", "value": {"one_of": ["a", "b"]}}], "id": "range-open"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "class", "value": {"one_of": [5]}}, {"key": "type", "value": "a"}], "id": "single"}
+        ])
+
+        def get_filter_ids(message):
+            return sorted(tuple(sorted(result.filter_ids)) for result in filter_handler.get_results(message={"val": 1, **message}, ignore_no_filter=True))
+
+        self.assertEqual(get_filter_ids({"fw": "1.0"}), [("set",)])
+        self.assertEqual(get_filter_ids({"fw": "1.1"}), [("exact", "set")])
+        self.assertEqual(get_filter_ids({"fw": "1.3"}), [])
+        self.assertEqual(get_filter_ids({"fw": "2.0.1"}), [("prefix",)])
+        self.assertEqual(get_filter_ids({"fw": "2.1.1"}), [("prefix", "prefix-long")])
+        self.assertEqual(get_filter_ids({"fw": "2"}), [])
+        self.assertEqual(get_filter_ids({"fw": 2}), [])
+        self.assertEqual(get_filter_ids({"class": 10, "type": "a"}), [("range",)])
+        self.assertEqual(get_filter_ids({"class": 19.5, "type": "a"}), [("range", "range-open")])
+        self.assertEqual(get_filter_ids({"class": 20, "type": "a"}), [("range-open",)])
+        self.assertEqual(get_filter_ids({"class": 12, "type": "b"}), [])
+        self.assertEqual(get_filter_ids({"class": 100, "type": "b"}), [("range-open",)])
+        self.assertEqual(get_filter_ids({"class": 5, "type": "a"}), [("single",)])
+        self.assertEqual(get_filter_ids({"class": 15, "type": "a"}), [("range", "range-open")])
+        self.assertEqual(get_filter_ids({"class": "12", "type": "a"}), [])
+        self.assertEqual(get_filter_ids({"class": True, "type": "a"}), [])
+        self.assertEqual(get_filter_ids({"class": float("nan"), "type": "a"}), [])
+        self.assertEqual(get_filter_ids({"class": float("inf"), "type": "a"}), [])
+        filter_handler.add_filters(filters=[
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "level", "value": {"one_of": [0, 1, 2]}}], "id": "falsy-numbers"},
+            {"source": "src", "mappings": mappings, "identifiers": [{"key": "level", "value": {"one_of": ["", False]}}], "id": "falsy-values"}
+        ])
+        self.assertEqual(get_filter_ids({"level": 0}), [("falsy-numbers",)])
+        self.assertEqual(get_filter_ids({"level": ""}), [("falsy-values",)])
+        self.assertEqual(get_filter_ids({"level": False}), [("falsy-values",)])
+        self.assertEqual(get_filter_ids({"level": 3}), [])
+        filter_handler.delete_filters(ids=["falsy-numbers", "falsy-values"])
+        batch_result = filter_handler.get_results_batch(messages=[{"fw": "1.0", "val": 1}, {"fw": "1.2", "val": 2}, {"fw": "2.5", "val": 3}])
+        self.assertEqual(sorted((group.filter_ids, len(group.indices)) for group in batch_result), [(("prefix",), 1), (("set",), 2)])
+        self.assertEqual(filter_handler.identify_message(message={"fw": "1.2"}), filter_handler.identify_message(message={"fw": "1.0"}))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state")
+            filter_handler.save_state(path=path)
+            loaded_handler = mf_lib.FilterHandler()
+            loaded_handler.load_state(path=path)
+            self.assertEqual(sorted(next(loaded_handler.get_results(message={"fw": "2.1", "val": 1})).filter_ids), ["prefix", "prefix-long"])
+        filter_handler.delete_filters(ids=["prefix", "range"])
+        self.assertEqual(get_filter_ids({"fw": "2.1.1"}), [("prefix-long",)])
+        self.assertEqual(get_filter_ids({"class": 12, "type": "a"}), [])
+        filter_handler.delete_filters(ids=["prefix-long", "range-open", "set"])
+        self.assertEqual(get_filter_ids({"fw": "1.0"}), [])
+        self.assertEqual(get_filter_ids({"class": 5, "type": "a"}), [("single",)])
+        for value in ({}, {"one_of": []}, {"one_of": [None]}, {"one_of": [[1]]}, {"prefix": 1}, {"min": 2, "max": 1}, {"min": "1"}, {"prefix": "a", "min": 1}, {"regex": "a"}):
+            self.assertRaises(mf_lib.exceptions.AddFilterError, filter_handler.add_filter, filter={"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": value}], "id": "invalid"})
+
+    def test_identifier_predicates_many(self):
+        filter_handler = mf_lib.FilterHandler()
+        mappings = {"val:data": "val"}
+        for num in range(200):
+            filter_handler.add_filter(filter={"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": {"prefix": f"{num}."}}], "id": f"filter-{num}"})
+
+        def get_filter_ids(message):
+            return sorted(tuple(sorted(result.filter_ids)) for result in filter_handler.get_results(message={"val": 1, **message}, ignore_no_filter=True))
+
+        self.assertEqual(get_filter_ids({"fw": "12.3"}), [("filter-12",)])
+        filter_handler.delete_filter(id="filter-12")
+        self.assertEqual(get_filter_ids({"fw": "12.3"}), [])
+        self.assertEqual(get_filter_ids({"fw": "199.0"}), [("filter-199",)])
+        filter_handler.add_filter(filter={"source": "src", "mappings": mappings, "identifiers": [{"key": "fw", "value": {"prefix": "12"}}], "id": "filter-12"})
+        self.assertEqual(get_filter_ids({"fw": "12.3"}), [("filter-12",)])
+        self.assertEqual(get_filter_ids({"fw": "120.1"}), [("filter-12", "filter-120")])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "state")
+            filter_handler.save_state(path=path)
+            loaded_handler = mf_lib.FilterHandler()
+            loaded_handler.load_state(path=path)
+            self.assertEqual(sorted(next(loaded_handler.get_results(message={"fw": "120.1", "val": 1})).filter_ids), ["filter-12", "filter-120"])
+        filter_handler.delete_filters(ids=[f"filter-{num}" for num in range(200)])
+        self.assertEqual(get_filter_ids({"fw": "120.1"}), [])
+
+    def test_compiled_builders(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"a:data": "a", "b:data": "x.b", "c:data": "c", "t:extra": "t"}, "id": "filter-1"})
+        compiled_keys = list()
+
+        def sum_builder(mapper):
+            return sum(value for key, value in mapper)
+
+        def compile_sum_builder(keys):
+            compiled_keys.append(keys)
+            return sum
+
+        sum_builder.compile = compile_sum_builder
+        message = {"a": 1, "x": {"b": 2}, "c": 3, "t": 4}
+
+        def plain_builder(mapper):
+            return mf_lib.builders.dict_builder(mapper)
+
+        for builder in (mf_lib.builders.dict_builder, mf_lib.builders.string_list_builder, mf_lib.builders.tuple_list_builder):
+            self.assertEqual(next(filter_handler.get_results(message=message, source="src", data_builder=builder)).data, builder(iter((("a", 1), ("b", 2), ("c", 3)))))
+        for _ in range(2):
+            self.assertEqual(next(filter_handler.get_results(message=message, source="src", data_builder=sum_builder, extra_builder=sum_builder)).data, 6)
+        self.assertEqual(compiled_keys, [("a", "b", "c"), ("t",)])
+        del message["x"]
+        self.assertIsInstance(next(filter_handler.get_results(message=message, source="src")).ex, mf_lib.exceptions.MappingError)
+        result = next(filter_handler.get_results(message=message, source="src", data_ignore_missing_keys=True))
+        self.assertEqual(result.data, {"a": 1, "c": 3})
+        self.assertEqual(next(filter_handler.get_results(message=message, source="src", data_builder=sum_builder, data_ignore_missing_keys=True)).data, 4)
+        self.assertEqual(compiled_keys[-1], ("a", "c"))
+        self.assertEqual(next(filter_handler.get_results(message=message, source="src", data_builder=plain_builder, data_ignore_missing_keys=True)).data, {"a": 1, "c": 3})
+        flat = {"a": 1, "x.b": 2, "t": 4}
+        self.assertEqual(next(filter_handler.get_results(message=flat, source="src", flat=True, data_ignore_missing_keys=True)).data, {"a": 1, "b": 2})
+
+    def test_lazy_results(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val", "time:extra": "t"}, "args": {"arg": 1}, "id": "filter-1"})
+        calls = list()
+
+        def builder(mapper):
+            calls.append(1)
+            return dict(mapper)
+
+        result = next(filter_handler.get_results(message={"val": 1, "t": 2}, source="src", data_builder=builder, extra_builder=builder, include_args=True, lazy=True))
+        self.assertIsInstance(result, mf_lib.FilterResult)
+        self.assertEqual((result.filter_ids, result.args, result.evaluated), (("filter-1",), {"filter-1": {"arg": 1}}, False))
+        self.assertEqual(calls, [])
+        filter_handler.delete_filter(id="filter-1")
+        self.assertEqual((result.data, result.extra, result.ex), ({"val": 1}, {"time": 2}, None))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(dict(result)["data"], {"val": 1})
+        self.assertEqual(len(calls), 2)
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1"})
+        result = next(filter_handler.get_results(message={"t": 2}, source="src", lazy=True))
+        self.assertIsInstance(result.ex, mf_lib.exceptions.MappingError)
+        self.assertIsNone(result.data)
+        batch_result = filter_handler.get_results_batch(messages=[{"val": 1}, {"val": 2}], sources="src", lazy=True)
+        results = batch_result.groups[0].results
+        self.assertFalse(any(result.evaluated for result in results))
+        self.assertEqual([result.data for result in results], [{"val": 1}, {"val": 2}])
+        result = next(filter_handler.get_results_from_bytes(payload=b'{"val": 3}', source="src", lazy=True))
+        self.assertEqual(pickle.loads(pickle.dumps(result)).data, {"val": 3})
+        metered_handler = mf_lib.FilterHandler(metrics=True)
+        metered_handler.add_filter(filter={"source": "src", "mappings": {"val:data": "val"}, "id": "filter-1"})
+        result = next(metered_handler.get_results(message={"val": 1}, source="src", lazy=True))
+        self.assertEqual(metered_handler.get_stats()["filters"], dict())
+        result.data = None
+        self.assertEqual(metered_handler.get_stats()["filters"]["filter-1"]["results"], 1)
+
+    def test_wire_builders(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filter(filter={"source": "src", "mappings": {"temp:data": "temp", "count:data": "count", "name:data": "name", "ok:data": "ok", "none:data": "none", "time:extra": "t", "device id:extra": "device"}, "id": "filter-1"})
+        message = {"temp": 21.5, "count": 3, "name": 'say "hi"\\', "ok": True, "none": None, "t": 1700000000000000000, "device": "dev 1"}
+        result = next(filter_handler.get_results(message=message, source="src", data_builder=mf_lib.builders.json_builder))
+        self.assertEqual(json.loads(result.data), {"temp": 21.5, "count": 3, "name": 'say "hi"\\', "ok": True, "none": None})
+        self.assertEqual(result.data, mf_lib.builders.json_builder(iter(json.loads(result.data).items())))
+        json_writer = mf_lib.builders.JsonWriter()
+        self.assertEqual(json_writer.getvalue(), b"[]")
+        json_writer.extend([result, result, mf_lib.FilterResult(ex=Exception())])
+        self.assertEqual(len(json.loads(json_writer.getvalue())), 2)
+        json_writer.clear()
+        self.assertEqual(len(json_writer), 0)
+        results = [next(filter_handler.get_results(message=dict(message, count=num), source="src", data_builder=mf_lib.builders.line_protocol_builder)) for num in range(2)]
+        self.assertEqual(results[0].data, b'temp=21.5,count=0i,name="say \\"hi\\"\\\\",ok=true')
+        writer = mf_lib.builders.LineProtocolWriter(measurement="my measurement", tag_keys=["device id"])
+        self.assertEqual(writer.extend(results), 2)
+        lines = writer.getvalue().decode().splitlines()
+        self.assertEqual(lines[1], 'my\\ measurement,device\\ id=dev\\ 1 temp=21.5,count=1i,name="say \\"hi\\"\\\\",ok=true 1700000000000000000')
+        writer.clear()
+        result = next(filter_handler.get_results(message=dict(message, t="17"), source="src", data_builder=mf_lib.builders.line_protocol_builder))
+        writer = mf_lib.builders.LineProtocolWriter(measurement_key="device id", time_converter=int)
+        writer.append(result)
+        self.assertTrue(writer.getvalue().endswith(b" 17\n"))
+        self.assertTrue(writer.getvalue().startswith(b"dev\\ 1 temp="))
+
+    def test_identifier_predicates_overlapping(self):
+        filter_handler = mf_lib.FilterHandler()
+        filter_handler.add_filters(filters=[
+            {"source": "src", "mappings": {"a:data": "val"}, "identifiers": [{"key": "fw", "value": {"one_of": ["1.0", "1.1"]}}], "id": "A"},
+            {"source": "src", "mappings": {"b:data": "val"}, "identifiers": [{"key": "fw", "value": "1.0"}], "id": "B"},
+            {"source": "src", "mappings": {"c:data": "val"}, "identifiers": [{"key": "fw", "value": {"prefix": "1."}}], "id": "C"},
+            {"source": "src", "mappings": {"a:data": "val"}, "identifiers": [{"key": "fw", "value": {"prefix": "1.0"}}], "id": "D"}
+        ])
+        copies_handler = mf_lib.FilterHandler()
+        copies_handler.add_filters(filters=[
+            {"source": "src", "mappings": {"a:data": "val"}, "identifiers": [{"key": "fw", "value": "1.0"}], "id": "A"},
+            {"source": "src", "mappings": {"b:data": "val"}, "identifiers": [{"key": "fw", "value": "1.0"}], "id": "B"},
+            {"source": "src", "mappings": {"c:data": "val"}, "identifiers": [{"key": "fw", "value": "1.0"}], "id": "C"},
+            {"source": "src", "mappings": {"a:data": "val"}, "identifiers": [{"key": "fw", "value": "1.0"}], "id": "D"}
+        ])
+
+        def get_results(handler, message):
+            return sorted((tuple(sorted(result.filter_ids)), result.data) for result in handler.get_results(message=message, ignore_no_filter=True))
+
+        message = {"fw": "1.0", "val": 1}
+        expected = [(("A", "D"), {"a": 1}), (("B",), {"b": 1}), (("C",), {"c": 1})]
+        self.assertEqual(get_results(filter_handler, message), expected)
+        self.assertEqual(get_results(copies_handler, message), expected)
+        self.assertEqual(get_results(filter_handler, {"fw": "1.1", "val": 2}), [(("A",), {"a": 2}), (("C",), {"c": 2})])
+        self.assertEqual(get_results(filter_handler, {"fw": "1.5", "val": 3}), [(("C",), {"c": 3})])
+        batch_result = filter_handler.get_results_batch(messages=[message, message, {"fw": "1.5", "val": 3}])
+        self.assertEqual(sorted((tuple(sorted(group.filter_ids)), group.indices) for group in batch_result), [(("A", "D"), [0, 1]), (("B",), [0, 1]), (("C",), [0, 1]), (("C",), [2])])
+        filter_handler.delete_filters(ids=["B", "D"])
+        self.assertEqual(get_results(filter_handler, message), [(("A",), {"a": 1}), (("C",), {"c": 1})])
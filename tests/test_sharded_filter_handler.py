@@ -0,0 +1,61 @@
+"""
+   Copyright 2022 InfAI (CC SES)
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import unittest
+import mf_lib
+import json
+
+with open("tests/resources/data_good.json") as file:
+    data_good: list = json.load(file)
+
+with open("tests/resources/filters_good.json") as file:
+    filters_good: list = json.load(file)
+
+
+class TestShardedFilterHandler(unittest.TestCase):
+    def _test_get_results_batch(self, shard_by):
+        filter_handler = mf_lib.FilterHandler()
+        with mf_lib.ShardedFilterHandler(workers=3, shard_by=shard_by) as sharded_handler:
+            for item in filters_good:
+                for handler in (filter_handler, sharded_handler):
+                    try:
+                        if item["action"] == "delete":
+                            handler.delete_filter(id=item["id"])
+                        if item["action"] == "add":
+                            handler.add_filter(filter=item["filter"])
+                    except mf_lib.exceptions.FilterHandlerError:
+                        pass
+            self.assertEqual(sorted(sharded_handler.get_sources()), sorted(filter_handler.get_sources()))
+            messages = list()
+            sources = list()
+            for source in data_good:
+                for message in data_good[source]:
+                    messages.append(message)
+                    sources.append(source)
+            expected = filter_handler.get_results_batch(messages=messages, sources=sources)
+            batch_result = sharded_handler.get_results_batch(messages=messages, sources=sources)
+            self.assertEqual(
+                sorted((pos, sorted(result.filter_ids), str(result.data), str(result.extra)) for group in batch_result for pos, result in group),
+                sorted((pos, sorted(result.filter_ids), str(result.data), str(result.extra)) for group in expected for pos, result in group)
+            )
+            self.assertEqual(sorted(batch_result.errors), sorted(expected.errors))
+            self.assertRaises(mf_lib.exceptions.AddFilterError, sharded_handler.add_filter, filter={"id": "test"})
+
+    def test_get_results_batch_by_source(self):
+        self._test_get_results_batch(shard_by=mf_lib.ShardBy.source)
+
+    def test_get_results_batch_by_identifier(self):
+        self._test_get_results_batch(shard_by=mf_lib.ShardBy.identifier)